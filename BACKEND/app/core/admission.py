@@ -0,0 +1,33 @@
+import threading
+
+
+class AdmissionGate:
+    """
+    Fixed pool of tokens handed out without waiting: acquire succeeds while
+    enough tokens are left and fails immediately once they run out. Used to
+    shed load in front of a contended resource; the resource itself must
+    still enforce its own limit.
+    """
+
+    def __init__(self, tokens):
+        self._tokens = tokens
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+    def try_acquire(self, count=1):
+        with self._lock:
+            if self._tokens < count:
+                return False
+            self._tokens -= count
+            return True
+
+    def release(self, count=1):
+        with self._lock:
+            self._tokens += count
+
+    def reset(self, tokens):
+        with self._lock:
+            self._tokens = tokens
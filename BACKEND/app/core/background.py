@@ -0,0 +1,45 @@
+"""
+Periodic background jobs run inside the API process.
+
+Jobs are plain sync functions (they use the sync Mongo client), so each run
+is moved to a worker thread to keep the event loop free. main.py starts the
+jobs on startup and stops them on shutdown; jobs registered with
+run_on_shutdown=True get one final run while stopping, e.g. to drain buffers,
+and jobs registered with run_on_startup=True run once right away instead of
+waiting a full interval, e.g. backfills the API relies on.
+"""
+import asyncio
+
+_jobs = []
+
+
+async def _run_periodic(name, interval_seconds, func, run_on_startup):
+    first_run = True
+    while True:
+        if not (first_run and run_on_startup):
+            await asyncio.sleep(interval_seconds)
+        first_run = False
+        try:
+            await asyncio.to_thread(func)
+        except Exception as e:
+            print(f"❌ Background job {name} failed:", e)
+
+
+def start_periodic(name, interval_seconds, func, run_on_shutdown=False, run_on_startup=False):
+    """Run func every interval_seconds until stop_all(). Must be called from the event loop"""
+    task = asyncio.create_task(_run_periodic(name, interval_seconds, func, run_on_startup))
+    _jobs.append((name, task, func if run_on_shutdown else None))
+
+
+async def stop_all():
+    for _, task, _ in _jobs:
+        task.cancel()
+    await asyncio.gather(*(task for _, task, _ in _jobs), return_exceptions=True)
+    for name, _, final_run in _jobs:
+        if final_run is None:
+            continue
+        try:
+            await asyncio.to_thread(final_run)
+        except Exception as e:
+            print(f"❌ Background job {name} failed on shutdown:", e)
+    _jobs.clear()
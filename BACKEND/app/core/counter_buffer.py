@@ -0,0 +1,43 @@
+import threading
+
+
+class CounterBuffer:
+    """
+    Process-local counters aggregated per key until drained, so hot paths can
+    count events without a database write each. Holds at most max_keys keys:
+    increments for new keys beyond that are dropped and counted in `dropped`
+    until the next drain.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self.dropped = 0
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._counts)
+
+    def increment(self, key, field, amount=1):
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                if len(self._counts) >= self.max_keys:
+                    self.dropped += amount
+                    return False
+                counts = self._counts[key] = {}
+            counts[field] = counts.get(field, 0) + amount
+            return True
+
+    def drain(self):
+        """Take everything buffered so far: {key: {field: amount}}"""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            self.dropped = 0
+            return counts
+
+    def restore(self, counts):
+        """Put drained counts back, e.g. after a failed flush"""
+        for key, fields in counts.items():
+            for field, amount in fields.items():
+                self.increment(key, field, amount)
@@ -1,8 +1,9 @@
 
 import os
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import MongoClient, AsyncMongoClient
 from pathlib import Path
+from app.core.query_stats import command_listener
 
 
 env_path = Path(__file__).parent.parent / '.env'
@@ -10,7 +11,9 @@ load_dotenv(dotenv_path=env_path)
 
 url = os.getenv("MONGODB_CONNECTION")
 print("MongoDB connection string:", url)  # Debug print
-client = MongoClient(url)
+client = MongoClient(url, event_listeners=[command_listener])
+# Async client for async def routes so they await Mongo instead of blocking the event loop
+async_client = AsyncMongoClient(url, event_listeners=[command_listener])
 
 try:
     client.admin.command('ping')
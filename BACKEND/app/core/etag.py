@@ -0,0 +1,70 @@
+"""
+Strong ETags for public catalog endpoints.
+
+Each collection has an in-process version counter that services bump on
+every write. An endpoint's ETag hashes the versions of the collections it
+reads together with the request path and query string, so a matching
+If-None-Match can be answered with 304 before any database work.
+
+Versions live in a shared etag_versions document per collection, so every
+worker builds the same ETag for the same content and a 304 can be answered
+by any of them. bump_version increments the shared document and keeps the
+returned value; a background job reads the others every ETAG_SYNC_SECONDS,
+so a write made by another worker changes the ETag within that interval.
+"""
+import hashlib
+import threading
+from pymongo import ReturnDocument
+from fastapi import Request, Response
+from app.core.database import client
+
+ETAG_SYNC_SECONDS = 5
+
+versions_collection = client['beads_db']['etag_versions']
+
+# Shared versions as last seen by this worker; they only ever grow
+_shared = {}
+_lock = threading.Lock()
+
+
+def _remember(collection, version):
+    with _lock:
+        if version > _shared.get(collection, 0):
+            _shared[collection] = version
+
+
+def bump_version(*collections):
+    """Mark collections as changed so ETags derived from them change"""
+    for collection in collections:
+        doc = versions_collection.find_one_and_update(
+            {'_id': collection}, {'$inc': {'version': 1}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        _remember(collection, doc['version'])
+
+
+def sync_versions():
+    """Pick up versions bumped by other workers"""
+    docs = list(versions_collection.find({}))
+    for doc in docs:
+        _remember(doc['_id'], doc.get('version', 0))
+    return len(docs)
+
+
+def make_etag(request: Request, *collections):
+    with _lock:
+        versions = ",".join(f"{c}:{_shared.get(c, 0)}" for c in collections)
+    key = f"{versions}|{request.url.path}?{request.url.query}"
+    return '"' + hashlib.sha1(key.encode()).hexdigest() + '"'
+
+
+def is_not_modified(request: Request, etag):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def not_modified(etag):
+    return Response(status_code=304, headers={"ETag": etag})
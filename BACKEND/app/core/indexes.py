@@ -0,0 +1,183 @@
+"""
+Declared MongoDB indexes for beads_db.
+
+Every query the services run by filter should be backed by an index listed
+here. Indexes are created idempotently on startup, or from the command line:
+
+    python -m app.core.indexes          # create missing indexes, then report drift
+    python -m app.core.indexes --check  # only report drift
+"""
+import argparse
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+from app.core.database import client
+
+db = client['beads_db']
+
+INDEXES = {
+    'products': [
+        # Catalog sort modes (see PRODUCT_SORTS), each with the category_id/is_available equality filters.
+        # Sort keys end with _id for keyset pagination; reverse scans serve the descending modes.
+        IndexModel([('category_id', ASCENDING), ('is_available', ASCENDING), ('_id', ASCENDING)], name='category_id_available_id'),
+        IndexModel([('is_available', ASCENDING), ('_id', ASCENDING)], name='available_id'),
+        IndexModel([('category_id', ASCENDING), ('is_available', ASCENDING), ('effective_price', ASCENDING), ('_id', ASCENDING)], name='category_id_available_effective_price_id'),
+        IndexModel([('is_available', ASCENDING), ('effective_price', ASCENDING), ('_id', ASCENDING)], name='available_effective_price_id'),
+        IndexModel([('category_id', ASCENDING), ('is_available', ASCENDING), ('ratings', ASCENDING), ('_id', ASCENDING)], name='category_id_available_ratings_id'),
+        IndexModel([('is_available', ASCENDING), ('ratings', ASCENDING), ('_id', ASCENDING)], name='available_ratings_id'),
+        IndexModel([('category_id', ASCENDING), ('is_available', ASCENDING), ('review_count', ASCENDING), ('_id', ASCENDING)], name='category_id_available_review_count_id'),
+        IndexModel([('is_available', ASCENDING), ('review_count', ASCENDING), ('_id', ASCENDING)], name='available_review_count_id'),
+        IndexModel([('offer_ids', ASCENDING)], name='offer_ids'),
+        # Name references on products the reference migration has not converted yet;
+        # partial, so they shrink to nothing once it has run (see product_references)
+        IndexModel([('category', ASCENDING)], name='legacy_category', partialFilterExpression={'category': {'$exists': True}}),
+        IndexModel([('offers', ASCENDING)], name='legacy_offers', partialFilterExpression={'offers': {'$exists': True}}),
+        # Category subtree browsing: every product under a category, at any depth
+        IndexModel([('category_path', ASCENDING)], name='category_path'),
+        IndexModel([('flash_sale', ASCENDING)], name='flash_sale', partialFilterExpression={'flash_sale': True}),
+        # Relevance-ranked catalog search: name matters most, then tags, then description
+        IndexModel(
+            [('name', TEXT), ('tags', TEXT), ('description', TEXT)],
+            name='product_search',
+            weights={'name': 10, 'tags': 5, 'description': 1}
+        ),
+    ],
+    'categories': [
+        IndexModel([('name', ASCENDING)], name='name_unique', unique=True),
+        IndexModel([('path', ASCENDING)], name='path'),
+    ],
+    'offers': [
+        IndexModel([('name', ASCENDING)], name='name_unique', unique=True),
+        IndexModel([('is_active', ASCENDING), ('priority', DESCENDING)], name='active_priority'),
+    ],
+    'orders': [
+        IndexModel([('user_id', ASCENDING), ('created_at', DESCENDING)], name='user_created'),
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING)], name='status_created'),
+        IndexModel([('created_at', DESCENDING)], name='created'),
+        IndexModel([('stock_reserved', ASCENDING), ('reservation_expires_at', ASCENDING)], name='reserved_expires'),
+    ],
+    'reviews': [
+        IndexModel([('product_id', ASCENDING), ('created_at', DESCENDING)], name='product_created'),
+        IndexModel([('product_id', ASCENDING), ('is_approved', ASCENDING), ('created_at', DESCENDING)], name='product_approved_created'),
+    ],
+    'product_co_purchases': [
+        IndexModel([('product_id', ASCENDING), ('other_id', ASCENDING)], name='product_other_unique', unique=True),
+        IndexModel([('product_id', ASCENDING), ('count', DESCENDING)], name='product_count'),
+    ],
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+    ],
+    'addresses': [
+        IndexModel([('user_id', ASCENDING), ('is_default', ASCENDING)], name='user_default'),
+    ],
+    'carts': [
+        IndexModel([('user_id', ASCENDING)], name='user_unique', unique=True),
+    ],
+    'wishlists': [
+        IndexModel([('user_id', ASCENDING)], name='user_unique', unique=True),
+        IndexModel([('items.product_id', ASCENDING)], name='items_product'),
+    ],
+    'notification_jobs': [
+        IndexModel([('status', ASCENDING), ('created_at', ASCENDING)], name='status_created'),
+    ],
+    'notifications': [
+        IndexModel([('dedupe_key', ASCENDING)], name='dedupe_key_unique', unique=True),
+        IndexModel([('user_id', ASCENDING), ('day', ASCENDING)], name='user_day'),
+    ],
+    'coupons': [
+        IndexModel([('code', ASCENDING)], name='code'),
+        IndexModel([('is_active', ASCENDING)], name='active'),
+    ],
+    'coupon_usages': [
+        IndexModel([('coupon_code', ASCENDING), ('user_id', ASCENDING)], name='coupon_user'),
+    ],
+}
+
+# Index options that make two indexes with the same keys different
+_COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression', 'weights')
+
+
+def _spec(index_doc):
+    """Normalize an index definition (declared or from index_information) for comparison"""
+    keys = index_doc['key']
+    if isinstance(keys, dict):
+        keys = keys.items()
+    spec = {'key': []}
+    for field, direction in keys:
+        # Mongo stores the fields of a text index as _fts/_ftsx; the fields live in weights
+        if direction == TEXT or field in ('_fts', '_ftsx'):
+            if ('_fts', TEXT) not in spec['key']:
+                spec['key'] += [('_fts', TEXT), ('_ftsx', 1)]
+            continue
+        spec['key'].append((field, direction))
+    for option in _COMPARED_OPTIONS:
+        if index_doc.get(option):
+            spec[option] = dict(index_doc[option]) if option == 'weights' else index_doc[option]
+    return spec
+
+
+def _actual_indexes(collection_name):
+    actual = {}
+    for name, info in db[collection_name].index_information().items():
+        if name == '_id_':
+            continue
+        actual[name] = _spec(info)
+    return actual
+
+
+def index_drift():
+    """
+    Compare declared indexes with the ones that exist in the database
+    Returns: {collection: {'missing': [...], 'extra': [...], 'changed': [...]}} for drifting collections only
+    """
+    report = {}
+    for collection_name, models in INDEXES.items():
+        actual = _actual_indexes(collection_name)
+        declared = {model.document['name']: _spec(model.document) for model in models}
+
+        missing = [name for name in declared if name not in actual]
+        extra = [name for name in actual if name not in declared]
+        changed = [name for name in declared if name in actual and actual[name] != declared[name]]
+
+        if missing or extra or changed:
+            report[collection_name] = {'missing': missing, 'extra': extra, 'changed': changed}
+    return report
+
+
+def ensure_indexes():
+    """
+    Create every declared index that does not exist yet.
+    Safe to run repeatedly; indexes whose definition changed are reported, not rebuilt.
+    Returns: {collection: [created index names]}
+    """
+    created = {}
+    for collection_name, models in INDEXES.items():
+        actual = _actual_indexes(collection_name)
+        to_create = [model for model in models if model.document['name'] not in actual]
+        if not to_create:
+            continue
+        try:
+            created[collection_name] = db[collection_name].create_indexes(to_create)
+        except OperationFailure as e:
+            print(f"❌ Could not create indexes on {collection_name}:", e)
+    return created
+
+
+def _print_drift(report):
+    if not report:
+        print("✅ Indexes match the declared registry")
+        return
+    for collection_name, drift in report.items():
+        for kind in ('missing', 'extra', 'changed'):
+            for name in drift[kind]:
+                print(f"{collection_name}: {kind} index '{name}'")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Create declared beads_db indexes and report drift")
+    parser.add_argument('--check', action='store_true', help="Only report drift, do not create indexes")
+    args = parser.parse_args()
+
+    if not args.check:
+        for collection_name, names in ensure_indexes().items():
+            print(f"{collection_name}: created {', '.join(names)}")
+    _print_drift(index_drift())
@@ -0,0 +1,78 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is an opaque, URL-safe token holding the sort key values of the
+last document on the previous page. The next page is fetched with a range
+filter on those values instead of skip, so every page costs the same no
+matter how deep it is. Sort keys must end with _id to be unique.
+"""
+import base64
+import binascii
+from datetime import datetime
+from bson import json_util
+from bson.errors import BSONError
+from bson.json_util import CANONICAL_JSON_OPTIONS
+from bson.objectid import ObjectId
+
+# Sort key values a cursor may hold; anything else (e.g. an operator document) is rejected
+CURSOR_VALUE_TYPES = (str, int, float, bool, ObjectId, datetime, type(None))
+
+
+def encode_cursor(document, sort_fields):
+    values = [document.get(field) for field, _ in sort_fields]
+    raw = json_util.dumps(values, json_options=CANONICAL_JSON_OPTIONS)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort_fields):
+    """Returns the sort key values stored in cursor; raises ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, BSONError, TypeError, KeyError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != len(sort_fields):
+        raise ValueError("Invalid cursor")
+    # The values go straight into equality clauses, so only plain scalars are allowed
+    if not all(isinstance(value, CURSOR_VALUE_TYPES) for value in values):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def keyset_filter(sort_fields, values):
+    """
+    Filter matching documents strictly after values in sort_fields order, e.g. for
+    [(price, 1), (_id, 1)]: price > p OR (price == p AND _id > id)
+
+    Null and missing values sort before everything else, and {$gt: null} or
+    {$lt: <value>} never match them, so: ascending after a null continues with
+    the non-null values; descending, the nulls follow every non-null value and
+    nothing follows a null.
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort_fields):
+        prefix = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort_fields[:i])}
+        value = values[i]
+        if direction == 1:
+            clauses.append({**prefix, field: {'$ne': None} if value is None else {'$gt': value}})
+        elif value is not None:
+            clauses.append({**prefix, field: {'$lt': value}})
+            clauses.append({**prefix, field: None})
+    if not clauses:
+        return {'_id': {'$in': []}}
+    return clauses[0] if len(clauses) == 1 else {'$or': clauses}
+
+
+def paginate(collection, query, sort_fields, limit, cursor=None, projection=None):
+    """
+    Fetch one page of query in sort_fields order.
+    Returns: (documents, next_cursor) - next_cursor is None on the last page
+    """
+    if cursor:
+        query = {'$and': [query, keyset_filter(sort_fields, decode_cursor(cursor, sort_fields))]}
+    # One extra document tells us whether there is a next page
+    documents = list(collection.find(query, projection).sort(sort_fields).limit(limit + 1))
+    if len(documents) <= limit:
+        return documents, None
+    documents = documents[:limit]
+    return documents, encode_cursor(documents[-1], sort_fields)
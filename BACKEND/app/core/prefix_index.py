@@ -0,0 +1,130 @@
+"""
+In-memory prefix index for autocomplete.
+
+Suggestions are kept in a sorted array of (key, suggestion id) pairs, so a
+prefix lookup is a bisect to the first matching key followed by a scan of
+the contiguous matching run. Every word of a suggestion starts a key
+("red glass beads", "glass beads", "beads"), so prefixes match mid-phrase.
+
+Short prefixes match long runs, so search results are cached per prefix
+until the next change to the index.
+
+Suggestions are contributed by owners (e.g. a product contributes its name,
+tags and category). Replacing or removing an owner updates only the keys it
+touched; a suggestion shared by several owners adds up their scores and
+disappears with its last owner. Building a whole index goes through load(),
+which sorts the keys once instead of inserting them one by one.
+"""
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+MAX_CACHED_PREFIXES = 4096
+
+
+def normalize(text):
+    """'Crème  Beads!' -> 'creme beads'"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(' ', text.lower()).strip()
+
+
+class PrefixIndex:
+
+    def __init__(self):
+        self._keys = []
+        self._suggestions = {}
+        self._owned = {}
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._suggestions)
+
+    def _keys_for(self, normalized):
+        words = normalized.split(' ')
+        return {' '.join(words[i:]) for i in range(len(words))}
+
+    def _add(self, owner, kind, text, score, ref, new_keys=None):
+        """new_keys collects keys to be sorted in later; without it keys are inserted in place"""
+        normalized = normalize(text)
+        if not normalized:
+            return
+        suggestion_id = (kind, normalized)
+        suggestion = self._suggestions.get(suggestion_id)
+        if suggestion is None:
+            suggestion = {'text': text, 'kind': kind, 'ref': ref, 'score': 0, 'owners': 0}
+            self._suggestions[suggestion_id] = suggestion
+            for key in self._keys_for(normalized):
+                if new_keys is None:
+                    insort(self._keys, (key, suggestion_id))
+                else:
+                    new_keys.append((key, suggestion_id))
+        suggestion['score'] += score
+        suggestion['owners'] += 1
+        self._owned.setdefault(owner, []).append((suggestion_id, score))
+
+    def _remove(self, owner):
+        for suggestion_id, score in self._owned.pop(owner, []):
+            suggestion = self._suggestions[suggestion_id]
+            suggestion['score'] -= score
+            suggestion['owners'] -= 1
+            if suggestion['owners'] > 0:
+                continue
+            del self._suggestions[suggestion_id]
+            for key in self._keys_for(suggestion_id[1]):
+                i = bisect_left(self._keys, (key, suggestion_id))
+                if i < len(self._keys) and self._keys[i] == (key, suggestion_id):
+                    del self._keys[i]
+
+    def replace(self, owner, suggestions):
+        """Set owner's suggestions to [(kind, text, score, ref)], dropping what it contributed before"""
+        with self._lock:
+            self._results.clear()
+            self._remove(owner)
+            for kind, text, score, ref in suggestions:
+                self._add(owner, kind, text, score, ref)
+
+    def load(self, owners):
+        """Add many owners at once from [(owner, [(kind, text, score, ref)])]; owners must not be in the index yet"""
+        with self._lock:
+            self._results.clear()
+            new_keys = []
+            for owner, suggestions in owners:
+                for kind, text, score, ref in suggestions:
+                    self._add(owner, kind, text, score, ref, new_keys)
+            self._keys.extend(new_keys)
+            self._keys.sort()
+
+    def remove(self, owner):
+        with self._lock:
+            self._results.clear()
+            self._remove(owner)
+
+    def search(self, prefix, limit=10):
+        """Highest scoring suggestions with a word starting with prefix"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            cached = self._results.get((prefix, limit))
+            if cached is not None:
+                return cached
+            matches = set()
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+                matches.add(self._keys[i][1])
+                i += 1
+            # Most popular first, ties alphabetically
+            best = heapq.nsmallest(limit, matches, key=lambda suggestion_id: (-self._suggestions[suggestion_id]['score'], suggestion_id[1]))
+            results = [
+                {key: self._suggestions[suggestion_id][key] for key in ('text', 'kind', 'ref', 'score')}
+                for suggestion_id in best
+            ]
+            if len(self._results) >= MAX_CACHED_PREFIXES:
+                self._results.clear()
+            self._results[(prefix, limit)] = results
+            return results
@@ -0,0 +1,42 @@
+"""
+Sparse fieldset helpers for list endpoints.
+
+`fields=name,price` on a list endpoint is parsed against the fields that
+endpoint can return, pushed down into the Mongo projection, and used to trim
+each response item. `id` is always returned.
+"""
+
+
+def parse_fields(fields, allowed):
+    """
+    'name,price' -> ['id', 'name', 'price'], or None when fields is empty.
+    Raises ValueError for fields the endpoint does not return.
+    """
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return ['id'] + [field for field in requested if field != 'id']
+
+
+def projection_for(fields, computed=None, always=()):
+    """
+    Mongo projection for response fields that are stored under the same name.
+    computed maps response fields built from other stored fields to those fields.
+    """
+    computed = computed or {}
+    projection = {field: 1 for field in always}
+    for field in fields:
+        if field == 'id':
+            continue
+        for source in computed.get(field, [field]):
+            projection[source] = 1
+    return projection
+
+
+def select_fields(item, fields):
+    if fields is None:
+        return item
+    return {field: item[field] for field in fields if field in item}
@@ -0,0 +1,180 @@
+"""
+Per-request MongoDB command instrumentation.
+
+A pymongo CommandListener is attached to both Mongo clients. While an HTTP
+request is being handled, every command it runs is recorded against that
+request (type, collection, filter shape, latency). The middleware in main.py
+turns this into a Server-Timing header and folds it into per-route totals
+served by GET /admin/query-stats.
+
+A filter shape is the command name, the collection and the sorted top-level
+filter keys - values are never recorded. The same shape repeated
+N_PLUS_ONE_THRESHOLD times in one request is flagged as an N+1 pattern.
+"""
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from pymongo import monitoring
+
+N_PLUS_ONE_THRESHOLD = 5
+
+_current_stats = ContextVar('mongo_request_stats', default=None)
+
+# Commands that carry a filter, and the field holding it
+_FILTER_FIELDS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'delete': 'deletes',
+    'update': 'updates',
+    'findAndModify': 'query',
+}
+
+
+def _filter_shape(command_name, command):
+    if command_name == 'aggregate':
+        pipeline = command.get('pipeline') or [{}]
+        spec = pipeline[0].get('$match', {})
+    else:
+        spec = command.get(_FILTER_FIELDS.get(command_name, ''), {})
+        # update/delete send a list of statements; the first one is representative
+        if isinstance(spec, list):
+            spec = spec[0].get('q', {}) if spec else {}
+    if not isinstance(spec, dict):
+        return ()
+    return tuple(sorted(spec.keys()))
+
+
+class RequestQueryStats:
+    def __init__(self):
+        self.command_count = 0
+        self.total_ms = 0.0
+        self.commands = Counter()
+        self.collections = Counter()
+        self.shapes = Counter()
+        self._pending = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.command.get('collection', '')
+        shape = (event.command_name, collection, _filter_shape(event.command_name, event.command))
+        self._pending[event.request_id] = shape
+
+    def finished(self, event):
+        shape = self._pending.pop(event.request_id, None)
+        if shape is None:
+            return
+        command_name, collection, _ = shape
+        self.command_count += 1
+        self.total_ms += event.duration_micros / 1000
+        self.commands[command_name] += 1
+        if collection:
+            self.collections[collection] += 1
+        self.shapes[shape] += 1
+
+    def n_plus_one(self):
+        """Shapes repeated often enough in this request to look like an N+1 loop"""
+        return [
+            {
+                'command': command_name,
+                'collection': collection,
+                'filter_keys': list(keys),
+                'count': count
+            }
+            for (command_name, collection, keys), count in self.shapes.items()
+            if count >= N_PLUS_ONE_THRESHOLD
+        ]
+
+    def server_timing(self):
+        return f'mongo;dur={self.total_ms:.1f};desc="{self.command_count} commands"'
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Routes command events to the stats of the request that issued them"""
+
+    def started(self, event):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.started(event)
+
+    def succeeded(self, event):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.finished(event)
+
+    def failed(self, event):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.finished(event)
+
+
+command_listener = MongoCommandListener()
+
+
+def start_request():
+    """Begin collecting stats for the current request. Returns (stats, token for end_request)"""
+    stats = RequestQueryStats()
+    return stats, _current_stats.set(stats)
+
+
+def end_request(token):
+    _current_stats.reset(token)
+
+
+# Per-route totals since startup, for the admin endpoint
+_route_totals = {}
+_route_totals_lock = threading.Lock()
+
+
+def record_request(route, stats):
+    n_plus_one = stats.n_plus_one()
+    with _route_totals_lock:
+        totals = _route_totals.setdefault(route, {
+            'requests': 0,
+            'commands': 0,
+            'total_ms': 0.0,
+            'max_commands': 0,
+            'n_plus_one_requests': 0,
+            'commands_by_type': Counter(),
+            'commands_by_collection': Counter(),
+            'n_plus_one_shapes': {}
+        })
+        totals['requests'] += 1
+        totals['commands'] += stats.command_count
+        totals['total_ms'] += stats.total_ms
+        totals['max_commands'] = max(totals['max_commands'], stats.command_count)
+        totals['commands_by_type'].update(stats.commands)
+        totals['commands_by_collection'].update(stats.collections)
+        if n_plus_one:
+            totals['n_plus_one_requests'] += 1
+            for shape in n_plus_one:
+                key = f"{shape['command']} {shape['collection']} {shape['filter_keys']}"
+                worst = totals['n_plus_one_shapes'].get(key, 0)
+                totals['n_plus_one_shapes'][key] = max(worst, shape['count'])
+
+
+def get_route_stats():
+    """Aggregated command stats per route, busiest routes first"""
+    with _route_totals_lock:
+        result = []
+        for route, totals in _route_totals.items():
+            requests = totals['requests']
+            result.append({
+                'route': route,
+                'requests': requests,
+                'avg_commands': round(totals['commands'] / requests, 2),
+                'max_commands': totals['max_commands'],
+                'avg_mongo_ms': round(totals['total_ms'] / requests, 2),
+                'commands_by_type': dict(totals['commands_by_type']),
+                'commands_by_collection': dict(totals['commands_by_collection']),
+                'n_plus_one_requests': totals['n_plus_one_requests'],
+                'n_plus_one_shapes': dict(totals['n_plus_one_shapes'])
+            })
+    result.sort(key=lambda item: item['requests'] * item['avg_commands'], reverse=True)
+    return result
+
+
+def reset_route_stats():
+    with _route_totals_lock:
+        _route_totals.clear()
@@ -1,6 +1,21 @@
-from fastapi import FastAPI
+import os
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from app.core import database  # Import the database module
+from app.core.indexes import ensure_indexes, index_drift
+from app.core import query_stats
+from app.core import background
+from app.core.etag import sync_versions, ETAG_SYNC_SECONDS
+from app.services.product.offer_service import refresh_scheduled_offers
+from app.services.product.recommendation_service import update_co_purchases, CO_PURCHASE_INTERVAL_SECONDS
+from app.services.product.suggest_service import rebuild_suggest_index, schedule_suggest_rebuild, SUGGEST_REBUILD_SECONDS
+from app.services.product.product_stats_service import flush_product_counters, COUNTER_FLUSH_SECONDS
+from app.services.product.inventory_service import expire_unpaid_reservations, EXPIRY_SWEEP_SECONDS
+from app.services.product.flash_sale_service import sync_flash_sales, FLASH_SALE_SYNC_SECONDS
+from app.services.utility.notification_service import process_notification_jobs, NOTIFICATION_SWEEP_SECONDS
+from app.services.product.review_service import backfill_rating_aggregates, RATING_BACKFILL_SECONDS
+from app.services.product.product_references import migrate_product_references, REFERENCE_MIGRATION_SECONDS
+from app.services.product.category_service import rebuild_category_counts, rebuild_category_paths, CATEGORY_COUNT_REBUILD_SECONDS, CATEGORY_PATH_REBUILD_SECONDS
 
 
 from app.route.product.category_routes import router as category_router
@@ -41,8 +56,79 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Mongo-Commands", "X-Mongo-N-Plus-One", "X-Next-Cursor", "ETag"],
 )
 
+@app.middleware("http")
+async def mongo_query_stats(request: Request, call_next):
+    stats, token = query_stats.start_request()
+    try:
+        response = await call_next(request)
+    finally:
+        query_stats.end_request(token)
+    route = request.scope.get("route")
+    # Unmatched URLs share one key, so 404 scans cannot grow the per-route totals without bound
+    route_path = route.path if route else "<unmatched>"
+    query_stats.record_request(f"{request.method} {route_path}", stats)
+    response.headers["Server-Timing"] = stats.server_timing()
+    response.headers["X-Mongo-Commands"] = str(stats.command_count)
+    if stats.n_plus_one():
+        response.headers["X-Mongo-N-Plus-One"] = "1"
+    return response
+
+@app.on_event("startup")
+def create_indexes():
+    # Set MONGODB_AUTO_INDEX=0 to manage indexes only through `python -m app.core.indexes`
+    if os.getenv("MONGODB_AUTO_INDEX", "1") == "0":
+        return
+    try:
+        ensure_indexes()
+        drift = index_drift()
+        if drift:
+            print("⚠️ Index drift detected:", drift)
+    except Exception as e:
+        print("❌ Could not create indexes:", e)
+
+@app.on_event("startup")
+async def start_background_jobs():
+    # Re-price products when scheduled offers start or end; the first sweep also backfills
+    # effective_price, which price filters and sorts rely on, so it runs at startup
+    background.start_periodic("offer-schedule", 60, refresh_scheduled_offers, run_on_startup=True)
+    # Fold new orders into "customers also bought"
+    background.start_periodic("co-purchase", CO_PURCHASE_INTERVAL_SECONDS, update_co_purchases)
+    # Keep autocomplete in step with writes made by other workers; the first build starts now
+    schedule_suggest_rebuild()
+    background.start_periodic("suggest-index", SUGGEST_REBUILD_SECONDS, rebuild_suggest_index)
+    # Cancel and restock prepaid orders left unpaid past their reservation
+    background.start_periodic("stock-reservations", EXPIRY_SWEEP_SECONDS, expire_unpaid_reservations)
+    # Refill flash-sale admission gates from stock changed by other workers
+    background.start_periodic("flash-sale-sync", FLASH_SALE_SYNC_SECONDS, sync_flash_sales)
+    # Pick up ETag versions bumped by other workers; the first read happens at startup
+    background.start_periodic("etag-versions", ETAG_SYNC_SECONDS, sync_versions, run_on_startup=True)
+    # Fan queued restock/price-drop jobs out to wishlist owners
+    background.start_periodic("wishlist-notifications", NOTIFICATION_SWEEP_SECONDS, process_notification_jobs)
+    # Correct drift in the incrementally maintained category product counts; runs at startup
+    # too, so counts missing on existing categories are filled in before $inc builds on them
+    background.start_periodic("category-counts", CATEGORY_COUNT_REBUILD_SECONDS, rebuild_category_counts, run_on_startup=True)
+    # Backfill category paths on categories and products and repair any that drifted;
+    # category pages match on category_path, so the first run happens at startup
+    background.start_periodic("category-paths", CATEGORY_PATH_REBUILD_SECONDS, rebuild_category_paths, run_on_startup=True)
+    # Fill in approved-only rating aggregates on products that predate them; a no-op once finished
+    background.start_periodic("rating-aggregates", RATING_BACKFILL_SECONDS, backfill_rating_aggregates, run_on_startup=True)
+    # Move products from category/offer names to ids; a no-op once finished
+    background.start_periodic("product-references", REFERENCE_MIGRATION_SECONDS, migrate_product_references)
+    # Write buffered view/click counts; the final run on shutdown drains what is left
+    background.start_periodic("product-counters", COUNTER_FLUSH_SECONDS, flush_product_counters, run_on_shutdown=True)
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    await background.stop_all()
+
+@app.on_event("shutdown")
+async def close_database_clients():
+    await database.async_client.close()
+    database.client.close()
+
 @app.get('/')
 def root():
     return{"message":"E-commerce is online"}
\ No newline at end of file
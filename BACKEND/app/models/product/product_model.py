@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional ,List
+from typing import Optional ,List ,Dict
 from datetime import datetime
 
 class Product(BaseModel):
@@ -15,15 +15,18 @@ class Product(BaseModel):
     stock_quantity : Optional[int] = Field(default=0)
     is_available : bool = Field(default = True)
 
-    category : str = Field(description = "Product category", default = 'Basic')
+    category_id : Optional[str] = Field(default = None, description = "Id of the product's category; the name is resolved on read")
     subcategory : Optional[str] = Field(default = None)
     tags : List[str] = Field(default = [])
-    offers: List[str] = Field(default=[], description="List of offer names applied to this product")
+    offer_ids: List[str] = Field(default=[], description="Ids of the offers applied to this product")
 
     image_urls :List[str] = Field(default= [])
 
-    ratings : Optional[int] =Field(default = 0.0, ge=0, le=5)
+    # Approved reviews only, kept current by review_service
+    ratings : Optional[float] =Field(default = 0.0, ge=0, le=5)
     review_count: int = Field(default=0, ge=0)
+    rating_sum: int = Field(default=0, ge=0)
+    rating_histogram: Dict[str, int] = Field(default={}, description="Approved review count per star rating")
     comments : List[str] = Field(default = [])
 
     created_at: datetime = Field(default_factory=datetime.now)
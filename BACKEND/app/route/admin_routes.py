@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
 from app.core.security import get_current_user, get_admin_user
-from app.services.admin_service import get_all_users, get_user_by_id_admin, get_dashboard_stats
+from app.services.admin_service import get_all_users, get_user_by_id_admin, get_dashboard_stats, USER_LIST_FIELDS
+from app.core.projection import parse_fields
+from app.core.query_stats import get_route_stats, reset_route_stats, N_PLUS_ONE_THRESHOLD
 
 router = APIRouter(
     prefix='/admin',
@@ -12,12 +15,28 @@ router = APIRouter(
 def get_dashboard_statistics(admin_user: dict = Depends(get_admin_user)):
     return get_dashboard_stats()
 
+# MongoDB commands per route since startup, with suspected N+1 query loops
+@router.get('/query-stats')
+def get_query_statistics(admin_user: dict = Depends(get_admin_user)):
+    return {
+        'n_plus_one_threshold': N_PLUS_ONE_THRESHOLD,
+        'routes': get_route_stats()
+    }
+
+@router.delete('/query-stats')
+def reset_query_statistics(admin_user: dict = Depends(get_admin_user)):
+    reset_route_stats()
+    return {"message": "Query statistics reset"}
+
 # Get all users (admin only)
 @router.get('/customers')
-def get_all_customers(current_user: dict = Depends(get_current_user)):
+def get_all_customers(fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     if not current_user.get('is_admin'):
         raise HTTPException(status_code=403, detail="Not authorized")
-    return get_all_users()
+    try:
+        return get_all_users(parse_fields(fields, USER_LIST_FIELDS))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # Get specific user by ID (admin only)
 @router.get('/customers/{user_id}')
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.schemas.product.category_schemas import CategoryCreate, CategoryUpdate, CategoryResponse, CategoryListItem, CategoryToggleActive
-from app.services.product.category_service import get_all_categories, get_category_by_id , create_category, update_category, toggle_category_active, delete_category, get_category_products
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from app.schemas.product.category_schemas import CategoryCreate, CategoryUpdate, CategoryResponse, CategoryListItem, CategoryTreeNode, CategoryToggleActive
+from app.services.product.category_service import get_all_categories, get_category_by_id , create_category, update_category, toggle_category_active, delete_category, get_category_products, get_category_tree
 from app.core.security import get_admin_user
+from app.core.etag import make_etag, is_not_modified, not_modified
 from fastapi import Body
 from app.schemas.product.category_schemas import CategoryToggleActive
 
@@ -15,11 +16,26 @@ router = APIRouter(
 # Public Routes
 
 @router.get('/', response_model=list[CategoryListItem])
-def get_all_categories_route():
+def get_all_categories_route(request: Request, response: Response):
+    # product_count depends on products too
+    etag = make_etag(request, 'categories', 'products')
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers['ETag'] = etag
     result = get_all_categories()
     return [cat.dict(by_alias=True) for cat in result]
 
 
+@router.get('/tree', response_model=list[CategoryTreeNode])
+def get_category_tree_route(request: Request, response: Response):
+    """Active categories as a nested tree for navigation"""
+    etag = make_etag(request, 'categories', 'products')
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers['ETag'] = etag
+    return get_category_tree()
+
+
 @router.get('/{category_id}', response_model=CategoryResponse)
 def get_category_by_id_route(category_id: str):
     result = get_category_by_id(category_id)
@@ -46,7 +62,10 @@ def create_category_route(
 ):
     category_data = category.dict()
     category_data['created_by'] = admin_user['user_id']
-    result = create_category(CategoryCreate(**category_data))
+    try:
+        result = create_category(CategoryCreate(**category_data))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return result
 
 
@@ -56,7 +75,10 @@ def update_category_route(
     category_update: CategoryUpdate,
     admin_user: dict = Depends(get_admin_user)
 ):
-    result =  update_category(category_id, category_update)
+    try:
+        result = update_category(category_id, category_update)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return result
 
 
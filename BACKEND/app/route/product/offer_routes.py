@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from app.schemas.product.offer_schemas import OfferCreate, OfferUpdate, OfferResponse, OfferListItem
 from app.services.product.offer_service import (
     get_all_offers, get_active_offers, get_offer_by_id, 
@@ -6,6 +6,7 @@ from app.services.product.offer_service import (
     delete_offer, get_offer_products
 )
 from app.core.security import get_admin_user
+from app.core.etag import make_etag, is_not_modified, not_modified
 
 router = APIRouter(
     prefix='/offers',
@@ -15,14 +16,22 @@ router = APIRouter(
 # Public Routes
 
 @router.get('/', response_model=list[OfferListItem])
-def get_all_offers_route():
+def get_all_offers_route(request: Request, response: Response):
     """Get all offers (admin view with product counts)"""
+    etag = make_etag(request, 'offers', 'products')
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers['ETag'] = etag
     result = get_all_offers()
     return [offer.dict(by_alias=True) for offer in result]
 
 @router.get('/active', response_model=list[OfferResponse])
-def get_active_offers_route():
+def get_active_offers_route(request: Request, response: Response):
     """Get only active offers (public)"""
+    etag = make_etag(request, 'offers')
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers['ETag'] = etag
     result = get_active_offers()
     return [offer.dict(by_alias=True) for offer in result]
 
@@ -1,7 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Optional
 from app.schemas.product.order_schemas import OrderCreate, OrderItemSchema, OrderListItem, OrderPaymentUpdate, OrderResponse, OrderStatusUpdate
-from app.services.product.order_service import get_order_by_id as get_order_by_id_service, get_order_by_id_admin, cancel_order as cancel_order_service, create_order, update_order_status, get_all_orders as get_all_orders_service, get_user_orders,update_payment_status as update_payment_status_service
+from app.services.product.order_service import (
+    create_order,
+    get_order_by_id_async,
+    get_order_by_id_admin_async,
+    cancel_order_async,
+    update_order_status_async,
+    get_all_orders_async,
+    get_user_orders_async,
+    update_payment_status_async,
+    get_payment_statistics_async,
+    ORDER_LIST_FIELDS
+)
+from app.core.projection import parse_fields
 from app.core.security import get_current_user, get_admin_user
 
 
@@ -18,42 +30,56 @@ def place_order(
     order_data: OrderCreate,
     current_user: dict = Depends(get_current_user)
 ):
-    result =  create_order(current_user['user_id'], order_data)
+    try:
+        result = create_order(current_user['user_id'], order_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return result
 
-@router.get('/me', response_model=List[OrderListItem])
-def get_my_orders(current_user: dict = Depends(get_current_user)):
-    result =  get_user_orders(current_user['user_id'])
+@router.get('/me', response_model=List[OrderListItem], response_model_exclude_unset=True)
+async def get_my_orders(fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """`fields` is a comma-separated list of order fields to return, e.g. fields=status,total"""
+    try:
+        wanted = parse_fields(fields, ORDER_LIST_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = await get_user_orders_async(current_user['user_id'], wanted)
     return result
 
 
 @router.get('/{order_id}', response_model=OrderResponse)
-def get_order_by_id_route(
+async def get_order_by_id_route(
     order_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    result = get_order_by_id_service(order_id, current_user['user_id'])
+    result = await get_order_by_id_async(order_id, current_user['user_id'])
     return result
 
 
 @router.post('/{order_id}/cancel', response_model=OrderResponse)
-def cancel_order_route(
+async def cancel_order_route(
     order_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    result = cancel_order_service(order_id, current_user['user_id'])
+    result = await cancel_order_async(order_id, current_user['user_id'])
     return result
 
 
 # Admin Routes - Order Management
 
-@router.get('/', response_model=List[OrderListItem])
+@router.get('/', response_model=List[OrderListItem], response_model_exclude_unset=True)
 async def get_all_orders(
     admin_user: dict = Depends(get_admin_user),
     status_filter: str = None,
-    limit: int = 50
+    limit: int = 50,
+    fields: Optional[str] = None
 ):
-    result = get_all_orders_service(status_filter, limit)
+    """`fields` is a comma-separated list of order fields to return, e.g. fields=status,total"""
+    try:
+        wanted = parse_fields(fields, ORDER_LIST_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = await get_all_orders_async(status_filter, limit, wanted)
     return result
 
 
@@ -62,7 +88,7 @@ async def get_order_by_id_admin_route(
     order_id: str,
     admin_user: dict = Depends(get_admin_user)
 ):
-    result = get_order_by_id_admin(order_id)
+    result = await get_order_by_id_admin_async(order_id)
     if not result:
         raise HTTPException(status_code=404, detail="Order not found")
     return result
@@ -74,19 +100,22 @@ async def update_order_status_route(
     status_update: OrderStatusUpdate,
     admin_user: dict = Depends(get_admin_user)
 ):
-    order = update_order_status(order_id, status_update.status)
+    try:
+        order = await update_order_status_async(order_id, status_update.status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
 
 
 @router.patch('/{order_id}/payment', response_model=OrderResponse)
-def update_payment_status_route(
+async def update_payment_status_route(
     order_id: str,
     payment_update: OrderPaymentUpdate,
     admin_user: dict = Depends(get_admin_user)
 ):
-    order = update_payment_status_service(order_id, payment_update.payment_status)
+    order = await update_payment_status_async(order_id, payment_update.payment_status)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
@@ -97,8 +126,7 @@ async def get_payment_stats(
     admin_user: dict = Depends(get_admin_user)
 ):
     """Get payment statistics for admin dashboard"""
-    from app.services.product.order_service import get_payment_statistics
-    stats = get_payment_statistics()
+    stats = await get_payment_statistics_async()
     return stats
 
 
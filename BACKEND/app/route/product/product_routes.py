@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import io
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
 from typing import Optional
-from app.schemas.product.product_schemas import (CreateProduct, ProductDetailUpdate, ProductPriceUpdate, ProductStockUpdate, ChangeAvailabilityProduct, ProductResponse)
+from app.schemas.product.product_schemas import (CreateProduct, ProductDetailUpdate, ProductPriceUpdate, ProductStockUpdate, ProductBulkPriceUpdate, ProductBulkStockUpdate, ProductBulkUpdateResult, FlashSaleUpdate, ChangeAvailabilityProduct, ProductResponse, ProductListItem, ProductPageResponse)
 from app.services.product.product_service import (
     change_availability as change_availability_service,
     get_product_by_id as get_product_by_id_service,
@@ -9,7 +11,22 @@ from app.services.product.product_service import (
     update_product as update_product_service,
     update_product_price as update_product_price_service,
     update_product_stock as update_product_stock_service,
-    get_all_products as get_all_products_service
+    get_products_page as get_products_page_service,
+    get_product_facets as get_product_facets_service,
+    PRODUCT_FIELDS
+)
+from app.services.product.product_page_service import get_product_page as get_product_page_service
+from app.services.product.recommendation_service import get_related_products as get_related_products_service
+from app.services.product.suggest_service import suggest as suggest_service
+from app.services.product.product_stats_service import record_view, record_click
+from app.services.product.flash_sale_service import set_flash_sale as set_flash_sale_service
+from app.core.projection import parse_fields
+from app.core.etag import make_etag, is_not_modified, not_modified
+from app.services.product.product_bulk_service import (
+    import_products as import_products_service,
+    export_products as export_products_service,
+    bulk_update_price as bulk_update_price_service,
+    bulk_update_stock as bulk_update_stock_service
 )
 from app.core.security import get_admin_user
 
@@ -20,34 +37,137 @@ router = APIRouter(
 
 # Public Routes - Product Browsing
 
-@router.get('/', response_model=list[ProductResponse])
+@router.get('/', response_model=list[ProductListItem], response_model_exclude_unset=True)
 def get_all_products(
+    request: Request,
+    response: Response,
     category: Optional[str] = None,
     search: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     is_available: Optional[bool] = None,
     skip: int = 0,
-    limit: int = 50
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    sort: Optional[str] = None
+):
+    """
+    `sort` is one of price_asc, price_desc, newest, rating, popularity.
+    Pass the X-Next-Cursor response header back as `cursor` (with the same sort) to fetch the next page.
+    `fields` is a comma-separated list of product fields to return, e.g. fields=name,price,image_urls
+    """
+    etag = make_etag(request, "products", "offers")
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    try:
+        result = get_products_page_service(
+            category=category,
+            search=search,
+            min_price=min_price,
+            max_price=max_price,
+            is_available=is_available,
+            skip=skip,
+            limit=limit,
+            cursor=cursor,
+            fields=parse_fields(fields, PRODUCT_FIELDS),
+            sort=sort
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result["next_cursor"]:
+        response.headers["X-Next-Cursor"] = result["next_cursor"]
+    return result["items"]
+
+
+@router.get('/facets')
+def get_product_facets(
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    is_available: Optional[bool] = None
 ):
-    result = get_all_products_service(
+    """Facet counts (category, price bucket, tag, offer, stock) for the current listing filters"""
+    result = get_product_facets_service(
         category=category,
         search=search,
         min_price=min_price,
         max_price=max_price,
-        is_available=is_available,
-        skip=skip,
-        limit=limit
+        is_available=is_available
     )
     return result
 
 
+@router.get('/suggest')
+def suggest_products(q: str = '', limit: int = Query(default=10, ge=1, le=25)):
+    """
+    Search-box autocomplete over product names, tags and categories, served
+    from an in-memory prefix index; cheap enough to call on every keystroke
+    """
+    return suggest_service(q, limit)
+
+
+@router.get('/export')
+def export_products(
+    format: str = 'csv',
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Stream the whole catalog as CSV or NDJSON (admin only)"""
+    if format not in ('csv', 'ndjson'):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    media_type = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    return StreamingResponse(
+        export_products_service(format),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="products.{format}"'}
+    )
+
+
 @router.get('/{product_id}', response_model=ProductResponse)
-def get_product_by_id(product_id: str):
+def get_product_by_id(product_id: str, request: Request, response: Response):
+    etag = make_etag(request, "products", "offers")
+    if is_not_modified(request, etag):
+        record_view(product_id)
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     result = get_product_by_id_service(product_id)
+    if result:
+        record_view(product_id)
     return result
 
 
+@router.get('/{product_id}/page', response_model=ProductPageResponse, response_model_exclude_unset=True)
+async def get_product_page(product_id: str):
+    """
+    Product detail page in one round trip: product, approved reviews,
+    rating histogram, active offers and related products
+    """
+    result = await get_product_page_service(product_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    record_view(product_id)
+    return result
+
+
+@router.post('/{product_id}/click', status_code=status.HTTP_204_NO_CONTENT)
+def record_product_click(product_id: str):
+    """Count a click on a product card (buffered, written in batches)"""
+    record_click(product_id)
+    return None
+
+
+@router.get('/{product_id}/related', response_model=list[ProductListItem], response_model_exclude_unset=True)
+def get_related_products(product_id: str, request: Request, response: Response):
+    """Customers also bought: precomputed from order co-purchases"""
+    etag = make_etag(request, "products", "offers", "product_recommendations")
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return get_related_products_service(product_id)
+
+
 # Admin Routes - Product Management
 
 @router.post('/', response_model=ProductResponse)
@@ -55,17 +175,69 @@ def create_product(
     product: CreateProduct,
     admin_user: dict = Depends(get_admin_user)
 ):
-    result = create_product_service(product)
+    try:
+        result = create_product_service(product)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return result
 
 
+@router.post('/import')
+def import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """
+    Bulk-create products from a CSV or NDJSON upload (admin only).
+    Columns/keys match CreateProduct; in CSV, tags/offers/image_urls are '|' separated.
+    The format is taken from the file extension unless given explicitly.
+    Returns a per-row error report instead of the created products.
+    """
+    if format is None:
+        filename = (file.filename or '').lower()
+        format = 'ndjson' if filename.endswith(('.ndjson', '.jsonl')) else 'csv'
+    if format not in ('csv', 'ndjson'):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    # Rows are read one at a time from the spooled upload
+    text_stream = io.TextIOWrapper(file.file, encoding='utf-8-sig', newline='')
+    return import_products_service(text_stream, format)
+
+
+@router.patch('/bulk/stock', response_model=ProductBulkUpdateResult)
+def bulk_update_stock(
+    updates: list[ProductBulkStockUpdate],
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Set stock for many products in one write, e.g. a warehouse sync (admin only)"""
+    try:
+        return bulk_update_stock_service(updates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.patch('/bulk/price', response_model=ProductBulkUpdateResult)
+def bulk_update_price(
+    updates: list[ProductBulkPriceUpdate],
+    admin_user: dict = Depends(get_admin_user)
+):
+    """Update price/discount_price/currency for many products in one write (admin only)"""
+    try:
+        return bulk_update_price_service(updates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.put('/{product_id}/details', response_model=ProductResponse)
 def update_product_details(
     product_id: str,
     product_update: ProductDetailUpdate,
     admin_user: dict = Depends(get_admin_user)
 ):
-    result = update_product_service(product_id, product_update)
+    try:
+        result = update_product_service(product_id, product_update)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return result
 
 
@@ -99,6 +271,21 @@ def toggle_product_availability(
     return result
 
 
+@router.put('/{product_id}/flash-sale')
+def set_flash_sale(
+    product_id: str,
+    flash_sale: FlashSaleUpdate,
+    admin_user: dict = Depends(get_admin_user)
+):
+    """
+    Put a product in flash-sale mode: checkouts pass an in-memory admission gate
+    sized to its stock and are rejected without database work once it sells out
+    """
+    if not set_flash_sale_service(product_id, flash_sale.enabled):
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {"product_id": product_id, "flash_sale": flash_sale.enabled}
+
+
 @router.delete('/{product_id}', status_code=status.HTTP_204_NO_CONTENT)
 def delete_product(
     product_id: str,
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from app.schemas.product.review_schemas import ReviewCreate, ReviewUpdate, ReviewResponse, ReviewListItem, ReviewApprovalUpdate, ReviewHelpfulUpdate
-from app.services.product.review_service import get_review_by_id, mark_review_helpful, create_review, delete_review, update_review, update_review_approval, get_product_reviews
+from app.services.product.review_service import mark_review_helpful, create_review, delete_review, update_review, update_review_approval_async, get_product_reviews_async
 from app.core.security import get_current_user, get_admin_user
 
 
@@ -21,12 +21,12 @@ def create_review_route(
 
 
 @router.get('/products/{product_id}', response_model=list[ReviewListItem])
-def get_product_reviews_route(
+async def get_product_reviews_route(
     product_id: str,
     skip: int = 0,
     limit: int = 20
 ):
-    result = get_product_reviews(product_id, skip, limit)
+    result = await get_product_reviews_async(product_id, skip, limit)
     return result
 
 
@@ -67,5 +67,5 @@ async def update_review_approval_route(
     approval: ReviewApprovalUpdate,
     admin_user: dict = Depends(get_admin_user)
 ):
-    result = update_review_approval(review_id, approval.is_approved)
+    result = await update_review_approval_async(review_id, approval.is_approved)
     return result
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -76,6 +76,18 @@ class CategoryListItem(BaseModel):
     product_count: Optional[int] = 0
 
 
+class CategoryTreeNode(BaseModel):
+    id: str = Field(alias="_id")
+    name: str
+    slug: str
+    image_url: Optional[str] = None
+    product_count: int = Field(default=0, description="Products in this category and all of its subcategories")
+    children: List["CategoryTreeNode"] = []
+
+    class Config:
+        populate_by_name = True
+
+
 class CategoryToggleActive(BaseModel):
     is_active: bool
 
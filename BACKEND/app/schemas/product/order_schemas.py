@@ -40,13 +40,14 @@ class OrderPaymentUpdate(BaseModel):
         description="New payment status"
     )
 class OrderListItem(BaseModel):
+    # Every field is optional so list endpoints can return sparse fieldsets (?fields=)
     id: str
-    user_id: str
-    total: float
+    user_id: Optional[str] = None
+    total: Optional[float] = None
     
-    status: str
-    payment_status: str
-    payment_method: str
-    shipping_address: dict
-    created_at: datetime
-    item_count: int = Field(description="How many different products in order")
+    status: Optional[str] = None
+    payment_status: Optional[str] = None
+    payment_method: Optional[str] = None
+    shipping_address: Optional[dict] = None
+    created_at: Optional[datetime] = None
+    item_count: Optional[int] = Field(default=None, description="How many different products in order")
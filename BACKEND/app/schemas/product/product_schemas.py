@@ -1,6 +1,8 @@
 from pydantic import BaseModel , Field
-from typing import Optional , List
+from typing import Optional , List , Dict
 from datetime import datetime
+from app.schemas.product.review_schemas import ReviewListItem
+from app.schemas.product.offer_schemas import OfferResponse
 
 class CreateProduct(BaseModel):
     name : str
@@ -36,6 +38,22 @@ class ProductPriceUpdate(BaseModel):
 class ProductStockUpdate(BaseModel):
     stock_quantity: int = Field(ge=0)
 
+class ProductBulkPriceUpdate(ProductPriceUpdate):
+    product_id: str
+    price: Optional[float] = None
+    discount_price: Optional[float] = None
+
+class ProductBulkStockUpdate(ProductStockUpdate):
+    product_id: str
+
+class ProductBulkUpdateResult(BaseModel):
+    matched: int
+    modified: int
+    not_found: List[str] = Field(default=[])
+
+class FlashSaleUpdate(BaseModel):
+    enabled: bool
+
 class ChangeAvailabilityProduct(BaseModel):
     is_available : Optional[bool]
     
@@ -66,3 +84,39 @@ class ProductResponse(BaseModel):
     created_at : datetime
     is_active : bool
 
+
+
+class ProductListItem(BaseModel):
+    # Every field is optional so list endpoints can return sparse fieldsets (?fields=)
+    id : str
+    name : Optional[str] = None
+    description: Optional[str] = None
+    image_urls : Optional[List[str]] = None
+
+    original_price: Optional[float] = None
+    price : Optional[float] = None
+    discount_price: Optional[float] = None
+    applied_discount: Optional[float] = None
+    applied_offer: Optional[str] = None
+    currency: Optional[str] = None
+
+    stock_quantity : Optional[int] = None
+    is_available : Optional[bool] = None
+
+    category : Optional[str] = None
+    subcategory : Optional[str] = None
+    tags: Optional[List[str]] = None
+    offers: Optional[List[str]] = None
+
+    ratings : Optional[float] = None
+    review_count : Optional[int] = None
+
+    created_at : Optional[datetime] = None
+    is_active : Optional[bool] = None
+
+class ProductPageResponse(BaseModel):
+    product: ProductResponse
+    reviews: List[ReviewListItem]
+    rating_histogram: Dict[int, int]
+    offers: List[OfferResponse]
+    related_products: List[ProductListItem]
@@ -1,23 +1,34 @@
 from app.core.database import client
+from app.core.projection import projection_for, select_fields
 from bson.objectid import ObjectId
 
 db = client['beads_db']
 
-def get_all_users():
-    """Get all users for admin dashboard"""
-    users = list(db['users'].find())
+# Fields the customer list can return; never includes the password hash
+USER_LIST_FIELDS = (
+    'id', 'username', 'email', 'firstname', 'lastname', 'phone', 'profile_image', 'is_verified',
+    'is_active', 'is_admin', 'created_at', 'last_login', 'order_history', 'addresses'
+)
+
+def get_all_users(fields=None):
+    """Get all users for admin dashboard, optionally limited to fields (see USER_LIST_FIELDS)"""
+    wanted = fields or USER_LIST_FIELDS
+    # Always project something: an empty projection would fetch whole documents, password hashes included
+    users = list(db['users'].find({}, projection_for(wanted, {'addresses': []}, always=('_id',))))
     result = []
     for user in users:
         user_id = str(user['_id'])
         
         # Fetch addresses from addresses collection
-        addresses = list(db['addresses'].find({'user_id': user_id}))
+        addresses = []
+        if 'addresses' in wanted:
+            addresses = list(db['addresses'].find({'user_id': user_id}))
         for addr in addresses:
             addr['id'] = str(addr['_id'])
             del addr['_id']
             addr.setdefault('is_default', False)
         
-        result.append({
+        result.append(select_fields({
             'id': user_id,
             'username': user.get('username', ''),
             'email': user.get('email', ''),
@@ -32,7 +43,7 @@ def get_all_users():
             'last_login': user.get('last_login'),
             'order_history': user.get('order_history', []),
             'addresses': addresses
-        })
+        }, fields))
     return result
 
 def get_user_by_id_admin(user_id: str):
@@ -2,27 +2,188 @@
 from app.core.database import client
 from app.models.product.product_category_model import Category
 from app.schemas.product.category_schemas import CategoryCreate, CategoryUpdate
+from app.services.product.pricing_service import apply_pricing
+from app.core.etag import bump_version
+from app.core.cache import TTLCache
+from app.services.product import suggest_service
+from app.services.product.product_references import category_filter, invalidate_category_names, references_migrated
+from pymongo import UpdateOne
 from bson import ObjectId
 from datetime import datetime
 
+# Each category stores path: its ancestors' ids from the root down, ending with
+# its own id. Products copy their category's path into category_path, so a
+# whole subtree is one indexed {'category_path': id} match on either collection.
+
 db = client['beads_db']  # Use your DB name here
 collection = db['categories']
 products_collection = db['products']
 
+# Category writes and product count changes invalidate; the TTL covers other workers
+CATEGORY_CACHE_TTL_SECONDS = 60
+CATEGORY_COUNT_REBUILD_SECONDS = 600
+CATEGORY_PATH_REBUILD_SECONDS = 600
+
+_cache = TTLCache(ttl_seconds=CATEGORY_CACHE_TTL_SECONDS, max_entries=2)
+
+def _category_changed():
+	_cache.invalidate()
+	invalidate_category_names()
+	bump_version('categories')
+
 def get_all_categories():
-	from datetime import datetime
-	categories = list(collection.find())
-	result = []
-	for cat in categories:
-		cat['_id'] = str(cat['_id'])
-		if 'created_at' not in cat:
-			cat['created_at'] = datetime.min
-		# Count products in this category
-		product_count = products_collection.count_documents({'category': cat['name']})
-		cat['product_count'] = product_count
-		result.append(Category(**cat))
+	"""All categories with their stored product_count, served from cache"""
+	result = _cache.get('all')
+	if result is None:
+		result = []
+		for cat in collection.find():
+			cat['_id'] = str(cat['_id'])
+			if 'created_at' not in cat:
+				cat['created_at'] = datetime.min
+			result.append(Category(**cat))
+		_cache.set('all', result)
 	return result
 
+def get_category_tree():
+	"""
+	Active categories as nested nodes for navigation, served from cache.
+	product_count covers the whole subtree; children of inactive categories are hidden.
+	"""
+	tree = _cache.get('tree')
+	if tree is None:
+		categories = get_all_categories()
+		nodes = {}
+		for cat in categories:
+			if cat.is_active:
+				nodes[cat.id] = {
+					'_id': cat.id,
+					'name': cat.name,
+					'slug': cat.slug,
+					'image_url': cat.image_url,
+					'product_count': cat.product_count or 0,
+					'parent_category': cat.parent_category,
+					'children': []
+				}
+		tree = []
+		all_ids = {cat.id for cat in categories}
+		for node in nodes.values():
+			parent_id = node.pop('parent_category')
+			if parent_id in nodes:
+				nodes[parent_id]['children'].append(node)
+			elif parent_id not in all_ids:
+				tree.append(node)
+
+		def finish(node):
+			node['children'].sort(key=lambda child: child['name'])
+			node['product_count'] += sum(finish(child) for child in node['children'])
+			return node['product_count']
+
+		tree.sort(key=lambda node: node['name'])
+		for node in tree:
+			finish(node)
+		_cache.set('tree', tree)
+	return tree
+
+def _parent_path(parent_id, category_id=None):
+	"""Path of the parent a category is created or moved under; [] for a top-level category"""
+	if not parent_id:
+		return []
+	try:
+		parent = collection.find_one({'_id': ObjectId(parent_id)}, {'path': 1})
+	except Exception:
+		parent = None
+	if not parent:
+		raise ValueError("Parent category not found")
+	path = parent.get('path') or [str(parent['_id'])]
+	if category_id and category_id in path:
+		raise ValueError("A category cannot be moved under itself or one of its subcategories")
+	return path
+
+def _move_category(category, parent_id):
+	"""Re-root the subtree of category under parent_id, rewriting the paths of its categories and products"""
+	category_id = str(category['_id'])
+	new_path = _parent_path(parent_id, category_id) + [category_id]
+	old_path = category.get('path') or [category_id]
+	if new_path != old_path:
+		# Swap the old ancestor prefix for the new one and keep the rest of each path
+		def rewrite(field):
+			return [{'$set': {field: {'$concatArrays': [
+				new_path,
+				{'$slice': [f'${field}', len(old_path), {'$size': f'${field}'}]}
+			]}}}]
+		collection.update_many({'path': category_id}, rewrite('path'))
+		products_collection.update_many({'category_path': category_id}, rewrite('category_path'))
+		bump_version('products')
+	collection.update_one({'_id': category['_id']}, {'$set': {'parent_category': parent_id or None, 'path': new_path}})
+
+def rebuild_category_paths():
+	"""
+	Recompute every category path from the parent_category pointers and copy it to the
+	category's products. Backfills existing data and repairs paths that drifted.
+	Returns: number of categories and products updated
+	"""
+	categories = {str(cat['_id']): cat for cat in collection.find({}, {'name': 1, 'parent_category': 1, 'path': 1})}
+	paths = {}
+
+	def path_of(category_id):
+		if category_id not in paths:
+			paths[category_id] = None  # guards against parent cycles
+			parent_id = categories[category_id].get('parent_category')
+			parent_path = path_of(parent_id) if parent_id in categories else []
+			paths[category_id] = (parent_path or []) + [category_id]
+		return paths[category_id]
+
+	operations = []
+	for category_id, cat in categories.items():
+		if cat.get('path') != path_of(category_id):
+			operations.append(UpdateOne({'_id': cat['_id']}, {'$set': {'path': paths[category_id]}}))
+	if operations:
+		collection.bulk_write(operations, ordered=False)
+		_category_changed()
+	updated = len(operations)
+	for category_id, cat in categories.items():
+		result = products_collection.update_many(
+			{**category_filter(category_id, cat['name']), 'category_path': {'$ne': paths[category_id]}},
+			{'$set': {'category_path': paths[category_id]}}
+		)
+		updated += result.modified_count
+	if updated > len(operations):
+		bump_version('products')
+	return updated
+
+def adjust_product_counts(deltas):
+	"""Apply {category id: change} to the stored product_count of each category"""
+	operations = [
+		UpdateOne({'_id': ObjectId(category_id)}, {'$inc': {'product_count': delta}})
+		for category_id, delta in deltas.items() if category_id and delta
+	]
+	if operations:
+		collection.bulk_write(operations, ordered=False)
+		_category_changed()
+
+def rebuild_category_counts():
+	"""
+	Recount products per category with one $group and store the counts that differ.
+	Backfills and corrects drift; normal product writes keep the counts current.
+	Returns: number of categories updated
+	"""
+	# Keyed by category id, or by name for products the reference migration has not reached
+	counts = {
+		row['_id']: row['count']
+		for row in products_collection.aggregate([
+			{'$group': {'_id': {'$ifNull': ['$category_id', '$category']}, 'count': {'$sum': 1}}}
+		])
+	}
+	operations = []
+	for cat in collection.find({}, {'name': 1, 'product_count': 1}):
+		count = counts.get(str(cat['_id']), 0) + counts.get(cat['name'], 0)
+		if cat.get('product_count') != count:
+			operations.append(UpdateOne({'_id': cat['_id']}, {'$set': {'product_count': count}}))
+	if operations:
+		collection.bulk_write(operations, ordered=False)
+		_category_changed()
+	return len(operations)
+
 def get_category_by_id(category_id: str):
 	from datetime import datetime
 	cat = collection.find_one({'_id': ObjectId(category_id)})
@@ -35,11 +196,27 @@ def get_category_by_id(category_id: str):
 
 def create_category(category: CategoryCreate):
 	data = category.dict()
+	category_id = ObjectId()
+	data['_id'] = category_id
+	data['parent_category'] = data.get('parent_category') or None
+	data['path'] = _parent_path(data['parent_category']) + [str(category_id)]
 	data['created_at'] = datetime.utcnow()
-	result = collection.insert_one(data)
-	return Category(**{**data, '_id': str(result.inserted_id)})
+	data['product_count'] = 0
+	collection.insert_one(data)
+	# Products left with this name because no category had it yet now reference it by id
+	adopted = products_collection.update_many(
+		{'category': data['name']},
+		{'$set': {'category_id': str(category_id), 'category_path': data['path']}, '$unset': {'category': ''}}
+	).modified_count
+	data['product_count'] = adopted
+	if adopted:
+		collection.update_one({'_id': category_id}, {'$set': {'product_count': adopted}})
+		bump_version('products')
+	_category_changed()
+	return Category(**{**data, '_id': str(category_id)})
 
 def update_category(category_id: str, category: CategoryUpdate):
+	"""parent_category moves the category with its subtree; an empty string makes it top-level"""
 	update_data = {k: v for k, v in category.dict().items() if v is not None}
 	
 	# Get the old category name before updating
@@ -50,15 +227,25 @@ def update_category(category_id: str, category: CategoryUpdate):
 	old_name = old_category.get('name')
 	new_name = update_data.get('name')
 	
+	# Move first: it validates the new parent before anything is written
+	if 'parent_category' in update_data:
+		_move_category(old_category, update_data.pop('parent_category'))
+	
 	# Update the category
-	collection.update_one({'_id': ObjectId(category_id)}, {'$set': update_data})
+	if update_data:
+		collection.update_one({'_id': ObjectId(category_id)}, {'$set': update_data})
+	_category_changed()
 	
-	# If category name changed, update all products with this category
+	# Products reference the category by id, so a rename writes only this document.
+	# Products the reference migration has not reached yet are moved to the id now.
 	if new_name and old_name != new_name:
-		products_collection.update_many(
-			{'category': old_name},
-			{'$set': {'category': new_name}}
-		)
+		if not references_migrated():
+			products_collection.update_many(
+				{'category': old_name},
+				{'$set': {'category_id': category_id}, '$unset': {'category': ''}}
+			)
+		bump_version('products')
+		suggest_service.invalidate_suggest_index()
 	
 	updated = collection.find_one({'_id': ObjectId(category_id)})
 	if updated:
@@ -72,6 +259,7 @@ def toggle_category_active(category_id: str):
 		return None
 	new_status = not cat.get('is_active', True)
 	collection.update_one({'_id': ObjectId(category_id)}, {'$set': {'is_active': new_status}})
+	_category_changed()
 	updated = collection.find_one({'_id': ObjectId(category_id)})
 	if updated:
 		updated['_id'] = str(updated['_id'])
@@ -85,21 +273,27 @@ def delete_category(category_id: str):
 		return False
 	
 	# Check if category has products
-	product_count = products_collection.count_documents({'category': category.get('name')})
+	product_count = products_collection.count_documents(category_filter(category_id, category.get('name')))
 	if product_count > 0:
 		raise ValueError(f"Cannot delete category. It has {product_count} products.")
 	
+	# The category's own path also matches {'path': id}
+	subcategory_count = collection.count_documents({'path': category_id}) - 1
+	if subcategory_count > 0:
+		raise ValueError(f"Cannot delete category. It has {subcategory_count} subcategories.")
+	
 	result = collection.delete_one({'_id': ObjectId(category_id)})
+	_category_changed()
 	return result.deleted_count > 0
 
 def get_category_products(category_id: str):
-	"""Get all products under a specific category"""
+	"""Get all products under a specific category and its subcategories"""
 	category = collection.find_one({'_id': ObjectId(category_id)})
 	if not category:
 		return None
 	
 	category_name = category.get('name')
-	products = list(products_collection.find({'category': category_name}))
+	products = apply_pricing(list(products_collection.find({'category_path': category_id})))
 	
 	# Format products
 	for product in products:
@@ -113,4 +307,9 @@ def get_category_products(category_id: str):
 		},
 		'products': products,
 		'total': len(products)
-	}
\ No newline at end of file
+	}
+
+
+if __name__ == '__main__':
+	print(f"✅ Updated paths of {rebuild_category_paths()} categories and products")
+	print(f"✅ Updated product counts of {rebuild_category_counts()} categories")
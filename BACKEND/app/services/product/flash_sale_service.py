@@ -0,0 +1,90 @@
+"""
+Flash-sale admission for hot products.
+
+A product in flash-sale mode (flash_sale: true) gets an in-process
+AdmissionGate holding one token per unit of stock. Checkout takes tokens
+before it touches Mongo, so once a drop sells out every further request is
+rejected without a read or write; admitted requests then reserve stock with
+the usual conditional update, which is what makes overselling impossible
+across workers. Gates are resynced from the database every few seconds to
+pick up restocks, cancellations and mode changes made elsewhere.
+"""
+import threading
+from collections import Counter
+from bson.objectid import ObjectId
+from app.core.database import client
+from app.core.admission import AdmissionGate
+from app.core.etag import bump_version
+
+db = client['beads_db']
+products_collection = db['products']
+
+FLASH_SALE_SYNC_SECONDS = 5
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def sync_flash_sales():
+    """Create, refill or drop gates to match the products currently in flash-sale mode"""
+    products = products_collection.find({"flash_sale": True}, {"stock_quantity": 1})
+    stock = {str(product["_id"]): product.get("stock_quantity") or 0 for product in products}
+    with _gates_lock:
+        for product_id in list(_gates):
+            if product_id not in stock:
+                del _gates[product_id]
+        for product_id, quantity in stock.items():
+            if product_id in _gates:
+                _gates[product_id].reset(quantity)
+            else:
+                _gates[product_id] = AdmissionGate(quantity)
+    return len(stock)
+
+
+def set_flash_sale(product_id, enabled):
+    """Turn flash-sale mode on or off; returns False when the product does not exist"""
+    result = products_collection.update_one({"_id": ObjectId(product_id)}, {"$set": {"flash_sale": enabled}})
+    if not result.matched_count:
+        return False
+    bump_version("products")
+    sync_flash_sales()
+    return True
+
+
+def is_sold_out(product_id, quantity=1):
+    """True when product_id is in flash-sale mode and fewer than quantity tokens are left"""
+    gate = _gates.get(product_id)
+    return gate is not None and gate.tokens < quantity
+
+
+def admit(items):
+    """
+    Take flash-sale tokens for every order item of a flash-sale product, all or nothing.
+    Raises ValueError when one is sold out.
+    Returns: the tokens taken, to hand back with release() if checkout fails later
+    """
+    taken = []
+    quantities = Counter()
+    for item in items:
+        quantities[item["product_id"]] += item.get("quantity", 1)
+    for product_id, quantity in quantities.items():
+        gate = _gates.get(product_id)
+        if gate is None:
+            continue
+        if not gate.try_acquire(quantity):
+            release(taken)
+            raise ValueError(f"{_item_name(items, product_id)} is sold out")
+        taken.append((gate, quantity))
+    return taken
+
+
+def release(taken):
+    for gate, quantity in taken:
+        gate.release(quantity)
+
+
+def _item_name(items, product_id):
+    for item in items:
+        if item["product_id"] == product_id and item.get("product_name"):
+            return item["product_name"]
+    return product_id
@@ -0,0 +1,147 @@
+"""
+Stock reservation for orders.
+
+Every order line takes its stock with one conditional update
+({'_id': id, 'stock_quantity': {'$gte': q}} -> $inc -q), so concurrent
+checkouts can never oversell and no global lock is needed. If a later line
+fails, the lines already taken are given back before the error is raised.
+
+An order records whether it still holds stock (stock_reserved). Releasing
+flips that flag with a conditional update first, so a cancel racing the
+expiry job restocks exactly once. Only orders whose goods have not left
+(RELEASABLE_STATUSES) give their stock back. Prepaid orders that stay
+unpaid and pending past reservation_expires_at are cancelled and restocked
+by a background job; cash-on-delivery orders keep their stock until cancelled.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from app.core.database import client, async_client
+from app.core.etag import bump_version
+
+db = client['beads_db']
+async_db = async_client['beads_db']
+products_collection = db['products']
+orders_collection = db['orders']
+
+RESERVATION_TIMEOUT_MINUTES = 30
+EXPIRY_SWEEP_SECONDS = 60
+# Payment methods that are settled on delivery, so their reservations never expire
+PAY_ON_DELIVERY_METHODS = ("cod",)
+# Once an order has shipped its stock is gone; cancelling it later does not restock
+RELEASABLE_STATUSES = ("pending", "processing")
+_RESERVATION_FIELDS = {"items.product_id": 1, "items.quantity": 1}
+
+
+def _order_lines(items):
+    """Merge order items into [(product_id, quantity)], one line per product"""
+    quantities = Counter()
+    for item in items:
+        quantities[item["product_id"]] += item.get("quantity", 1)
+    return list(quantities.items())
+
+
+def _restock_operations(lines):
+    return [
+        UpdateOne({"_id": ObjectId(product_id)}, {"$inc": {"stock_quantity": quantity}})
+        for product_id, quantity in lines
+    ]
+
+
+def _restock(lines):
+    if lines:
+        products_collection.bulk_write(_restock_operations(lines), ordered=False)
+        bump_version("products")
+
+
+def reserve_stock(items):
+    """
+    Take stock for every order item, all or nothing.
+    Raises ValueError naming the first product without enough stock.
+    """
+    reserved = []
+    try:
+        for product_id, quantity in _order_lines(items):
+            result = products_collection.update_one(
+                {"_id": ObjectId(product_id), "stock_quantity": {"$gte": quantity}},
+                {"$inc": {"stock_quantity": -quantity}}
+            )
+            if not result.modified_count:
+                product = products_collection.find_one({"_id": ObjectId(product_id)}, {"name": 1})
+                name = product.get("name", product_id) if product else product_id
+                raise ValueError(f"Insufficient stock for {name}")
+            reserved.append((product_id, quantity))
+    except Exception:
+        _restock(reserved)
+        raise
+    if reserved:
+        bump_version("products")
+
+
+def release_items(items):
+    """Give back stock taken by reserve_stock for an order that was never saved"""
+    _restock(_order_lines(items))
+
+
+def reservation_fields(payment_method, now=None):
+    """Fields a newly created order stores to track the stock it holds"""
+    now = now or datetime.utcnow()
+    expires_at = None
+    if payment_method not in PAY_ON_DELIVERY_METHODS:
+        expires_at = now + timedelta(minutes=RESERVATION_TIMEOUT_MINUTES)
+    return {"stock_reserved": True, "reservation_expires_at": expires_at}
+
+
+def release_order_stock(order_id, extra_fields=None, conditions=None):
+    """
+    Restock an order's items if it still holds them; a no-op otherwise.
+    conditions further restrict which order state may be released, and
+    extra_fields are set on the order in the same update.
+    Returns: True when stock was released
+    """
+    order = orders_collection.find_one_and_update(
+        {"_id": ObjectId(order_id), "stock_reserved": True, **(conditions or {})},
+        {"$set": {"stock_reserved": False, "reservation_expires_at": None, **(extra_fields or {})}},
+        projection=_RESERVATION_FIELDS
+    )
+    if not order:
+        return False
+    _restock(_order_lines(order.get("items", [])))
+    return True
+
+
+async def release_order_stock_async(order_id, extra_fields=None, conditions=None):
+    """Async variant of release_order_stock"""
+    order = await async_db["orders"].find_one_and_update(
+        {"_id": ObjectId(order_id), "stock_reserved": True, **(conditions or {})},
+        {"$set": {"stock_reserved": False, "reservation_expires_at": None, **(extra_fields or {})}},
+        projection=_RESERVATION_FIELDS
+    )
+    if not order:
+        return False
+    lines = _order_lines(order.get("items", []))
+    if lines:
+        await async_db["products"].bulk_write(_restock_operations(lines), ordered=False)
+        bump_version("products")
+    return True
+
+
+def expire_unpaid_reservations(now=None):
+    """
+    Cancel unpaid prepaid orders whose reservation has run out and restock them
+    Returns: number of orders expired
+    """
+    now = now or datetime.utcnow()
+    query = {
+        "stock_reserved": True,
+        "status": "pending",
+        "reservation_expires_at": {"$lte": now},
+        "payment_status": {"$in": ["unpaid", "failed"]}
+    }
+    expired = 0
+    for order in orders_collection.find(query, {"_id": 1}):
+        # Re-checked in the release itself, so a payment or cancel that got there first wins
+        if release_order_stock(order["_id"], {"status": "cancelled", "cancel_reason": "payment_timeout"}, query):
+            expired += 1
+    return expired
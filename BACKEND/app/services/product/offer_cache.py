@@ -0,0 +1,49 @@
+from app.core.database import client
+from app.core.cache import TTLCache
+from datetime import datetime
+
+db = client['beads_db']
+offers_collection = db['offers']
+
+# offer_service invalidates on every write; the TTL covers writes from other workers
+OFFER_CACHE_TTL_SECONDS = 60
+
+_cache = TTLCache(ttl_seconds=OFFER_CACHE_TTL_SECONDS, max_entries=2)
+
+
+def _in_schedule(offer, now):
+    start_date = offer.get('start_date')
+    end_date = offer.get('end_date')
+    if start_date and start_date > now:
+        return False
+    if end_date and end_date <= now:
+        return False
+    return True
+
+
+def get_active_offers_by_id(now=None):
+    """
+    All active offers keyed by id (as stored in products.offer_ids), in descending priority order.
+    Offers outside their start_date/end_date window are left out.
+    Loaded with a single query and reused until invalidated or expired.
+    """
+    offers = _cache.get('active')
+    if offers is None:
+        active_offers = offers_collection.find({'is_active': True}).sort('priority', -1)
+        offers = {str(offer['_id']): offer for offer in active_offers}
+        _cache.set('active', offers)
+    now = now or datetime.utcnow()
+    return {offer_id: offer for offer_id, offer in offers.items() if _in_schedule(offer, now)}
+
+
+def get_offer_names(refresh=False):
+    """Every offer, active or not, as {id: name}; refresh reloads it first"""
+    names = None if refresh else _cache.get('names')
+    if names is None:
+        names = {str(offer['_id']): offer['name'] for offer in offers_collection.find({}, {'name': 1})}
+        _cache.set('names', names)
+    return names
+
+
+def invalidate_offer_cache():
+    _cache.invalidate()
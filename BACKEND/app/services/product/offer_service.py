@@ -1,6 +1,10 @@
 from app.core.database import client
 from app.models.product.offer_model import Offer
 from app.schemas.product.offer_schemas import OfferCreate, OfferUpdate
+from app.services.product.offer_cache import invalidate_offer_cache
+from app.core.etag import bump_version
+from app.services.product.pricing_service import apply_pricing, refresh_effective_prices
+from app.services.product.product_references import offer_filter, references_migrated
 from bson import ObjectId
 from datetime import datetime
 
@@ -18,7 +22,7 @@ def get_all_offers():
             offer['created_at'] = datetime.min
         
         # Count products with this offer
-        product_count = products_collection.count_documents({'offers': offer['name']})
+        product_count = products_collection.count_documents(offer_filter([offer['_id']], [offer['name']]))
         offer['product_count'] = product_count
         
         result.append(Offer(**offer))
@@ -56,6 +60,10 @@ def create_offer(offer: OfferCreate):
     data = offer.dict()
     data['created_at'] = datetime.utcnow()
     result = collection.insert_one(data)
+    invalidate_offer_cache()
+    bump_version("offers")
+    # Products the reference migration has not reached may already list this offer name
+    refresh_effective_prices(offer_filter([str(result.inserted_id)], [data['name']]))
     return Offer(**{**data, '_id': str(result.inserted_id)})
 
 def update_offer(offer_id: str, offer: OfferUpdate):
@@ -72,15 +80,22 @@ def update_offer(offer_id: str, offer: OfferUpdate):
     
     # Update the offer
     collection.update_one({'_id': ObjectId(offer_id)}, {'$set': update_data})
+    invalidate_offer_cache()
+    bump_version("offers")
     
-    # If offer name changed, update all products with this offer
+    # Products reference the offer by id, so a rename writes only this document.
+    # Products the reference migration has not reached yet still list the name.
     if new_name and old_name != new_name:
-        # Update products: replace old offer name with new name in the offers array
-        products_collection.update_many(
-            {'offers': old_name},
-            {'$set': {'offers.$[elem]': new_name}},
-            array_filters=[{'elem': old_name}]
-        )
+        if not references_migrated():
+            products_collection.update_many(
+                {'offers': old_name},
+                {'$set': {'offers.$[elem]': new_name}},
+                array_filters=[{'elem': old_name}]
+            )
+        bump_version("products")
+    
+    # Discount, schedule or status may have changed the price of every product with this offer
+    refresh_effective_prices(offer_filter([offer_id], [new_name or old_name]))
     
     updated = collection.find_one({'_id': ObjectId(offer_id)})
     if updated:
@@ -96,6 +111,9 @@ def toggle_offer_active(offer_id: str):
     
     new_status = not offer.get('is_active', True)
     collection.update_one({'_id': ObjectId(offer_id)}, {'$set': {'is_active': new_status}})
+    invalidate_offer_cache()
+    bump_version("offers")
+    refresh_effective_prices(offer_filter([offer_id], [offer.get('name')]))
     
     updated = collection.find_one({'_id': ObjectId(offer_id)})
     if updated:
@@ -111,13 +129,41 @@ def delete_offer(offer_id: str):
         return False
     
     # Check if offer has products
-    product_count = products_collection.count_documents({'offers': offer.get('name')})
+    product_count = products_collection.count_documents(offer_filter([offer_id], [offer.get('name')]))
     if product_count > 0:
         raise ValueError(f"Cannot delete offer. It's applied to {product_count} products.")
     
     result = collection.delete_one({'_id': ObjectId(offer_id)})
+    invalidate_offer_cache()
+    bump_version("offers")
     return result.deleted_count > 0
 
+_last_schedule_sweep = None
+
+def refresh_scheduled_offers():
+    """
+    Re-price products whose offers started or ended since the previous sweep.
+    The first sweep after startup re-prices every scheduled offer and backfills
+    products that were never priced. Runs periodically from main.py.
+    """
+    global _last_schedule_sweep
+    now = datetime.utcnow()
+    if _last_schedule_sweep is None:
+        query = {'$or': [{'start_date': {'$ne': None}}, {'end_date': {'$ne': None}}]}
+    else:
+        window = {'$gt': _last_schedule_sweep, '$lte': now}
+        query = {'$or': [{'start_date': window}, {'end_date': window}]}
+    offers = list(collection.find(query, {'name': 1}))
+    
+    modified = 0
+    if offers:
+        offer_ids = [str(offer['_id']) for offer in offers]
+        modified += refresh_effective_prices(offer_filter(offer_ids, [offer['name'] for offer in offers]))
+    if _last_schedule_sweep is None:
+        modified += refresh_effective_prices({'effective_price': {'$exists': False}})
+    _last_schedule_sweep = now
+    return modified
+
 def get_offer_products(offer_id: str):
     """Get all products with this offer"""
     offer = collection.find_one({'_id': ObjectId(offer_id)})
@@ -125,7 +171,7 @@ def get_offer_products(offer_id: str):
         return None
     
     offer_name = offer.get('name')
-    products = list(products_collection.find({'offers': offer_name}))
+    products = apply_pricing(list(products_collection.find(offer_filter([offer_id], [offer_name]))))
     
     # Format products
     for product in products:
@@ -1,9 +1,106 @@
-from app.core.database import client
+from app.core.database import client, async_client
 from bson.objectid import ObjectId
 from datetime import datetime
+from app.core.projection import select_fields
 from app.services.utility.coupon_service import validate_coupon
+from app.services.product import flash_sale_service
+from app.services.product.inventory_service import (
+	reserve_stock, release_items, reservation_fields,
+	release_order_stock_async, RELEASABLE_STATUSES
+)
 
 db = client['beads_db']
+async_db = async_client['beads_db']
+
+
+# List views only need the summary fields; items are reduced to their count inside Mongo
+ORDER_LIST_PROJECTION = {
+	"user_id": 1,
+	"total": 1,
+	"status": 1,
+	"payment_status": 1,
+	"payment_method": 1,
+	"shipping_address": 1,
+	"created_at": 1,
+	"item_count": {"$size": {"$ifNull": ["$items", []]}}
+}
+ORDER_LIST_FIELDS = ("id",) + tuple(ORDER_LIST_PROJECTION)
+
+def _order_list_projection(fields=None):
+	"""ORDER_LIST_PROJECTION limited to fields (see ORDER_LIST_FIELDS); _id keeps it from ever being empty"""
+	if fields is None:
+		return ORDER_LIST_PROJECTION
+	return {"_id": 1, **{field: ORDER_LIST_PROJECTION[field] for field in fields if field in ORDER_LIST_PROJECTION}}
+
+def _format_order_list_item(order, default_payment_method="cod"):
+	return {
+		"id": str(order.get("_id")),
+		"user_id": order.get("user_id", ""),
+		"total": order.get("total", 0.0),
+		"status": order.get("status", "pending"),
+		"payment_status": order.get("payment_status", "unpaid"),
+		"payment_method": order.get("payment_method", default_payment_method),
+		"shipping_address": order.get("shipping_address", {}),
+		"created_at": order.get("created_at"),
+		"item_count": order.get("item_count", len(order.get("items", [])))
+	}
+
+def _missing_image_product_ids(items):
+	"""Product ids of order items that still need a product image"""
+	product_ids = []
+	for item in items:
+		if not item.get("product_image") and item.get("product_id"):
+			product_ids.append(ObjectId(item["product_id"]))
+	return product_ids
+
+def _enrich_items(items, products):
+	"""Fill product_image on each item from a list of fetched product documents"""
+	images = {}
+	for product in products:
+		image_urls = product.get("image_urls", [])
+		images[str(product["_id"])] = image_urls[0] if image_urls else None
+	enriched_items = []
+	for item in items:
+		enriched_item = dict(item)
+		if not enriched_item.get("product_image") and item.get("product_id") in images:
+			enriched_item["product_image"] = images[item["product_id"]]
+		enriched_items.append(enriched_item)
+	return enriched_items
+
+def _format_order(order, enriched_items):
+	return {
+		"id": str(order.get("_id")),
+		"user_id": order.get("user_id", ""),
+		"items": enriched_items,
+		"subtotal": order.get("subtotal", 0.0),
+		"shipping_cost": order.get("shipping_cost", 0.0),
+		"discount_amount": order.get("discount_amount", 0.0),
+		"coupon_code": order.get("coupon_code", None),
+		"total": order.get("total", 0.0),
+		"shipping_address": order.get("shipping_address", {}),
+		"payment_method": order.get("payment_method", "cod"),
+		"status": order.get("status", "pending"),
+		"payment_status": order.get("payment_status", "unpaid"),
+		"created_at": order.get("created_at"),
+		"item_count": len(order.get("items", []))
+	}
+
+def _load_order_items(order):
+	items = order.get("items", [])
+	product_ids = _missing_image_product_ids(items)
+	products = []
+	if product_ids:
+		products = list(db["products"].find({"_id": {"$in": product_ids}}, {"image_urls": 1}))
+	return _enrich_items(items, products)
+
+async def _load_order_items_async(order):
+	items = order.get("items", [])
+	product_ids = _missing_image_product_ids(items)
+	products = []
+	if product_ids:
+		cursor = async_db["products"].find({"_id": {"$in": product_ids}}, {"image_urls": 1})
+		products = await cursor.to_list(length=None)
+	return _enrich_items(items, products)
 
 
 def create_order(user_id, order_data):
@@ -17,35 +114,11 @@ def create_order(user_id, order_data):
 		from app.services.user.cart_service import get_cart
 		cart = get_cart(user_id)
 		items = cart.get("items", [])
-		# Enrich items with product images
-		enriched_items = []
-		for item in items:
-			enriched_item = dict(item)
-			if "product_image" not in enriched_item or not enriched_item.get("product_image"):
-				product_id = item.get("product_id")
-				if product_id:
-					product = db["products"].find_one({"_id": ObjectId(product_id)})
-					if product:
-						image_urls = product.get("image_urls", [])
-						enriched_item["product_image"] = image_urls[0] if image_urls else None
-			enriched_items.append(enriched_item)
-		order_dict["items"] = enriched_items
 		order_dict["subtotal"] = cart.get("total_price", 0.0)
 	else:
-		# Enrich provided items with product images
-		enriched_items = []
-		for item in items:
-			enriched_item = dict(item)
-			if "product_image" not in enriched_item or not enriched_item.get("product_image"):
-				product_id = item.get("product_id")
-				if product_id:
-					product = db["products"].find_one({"_id": ObjectId(product_id)})
-					if product:
-						image_urls = product.get("image_urls", [])
-						enriched_item["product_image"] = image_urls[0] if image_urls else None
-			enriched_items.append(enriched_item)
-		order_dict["items"] = enriched_items
 		order_dict["subtotal"] = order_dict.get("subtotal", 0.0)
+	# Enrich items with product images, fetching all missing ones in one query
+	order_dict["items"] = _load_order_items({"items": items})
 
 	order_dict["shipping_cost"] = order_dict.get("shipping_cost", 0.0)
 
@@ -119,147 +192,93 @@ def create_order(user_id, order_data):
 
 	order_dict["payment_status"] = order_dict.get("payment_status", "unpaid")
 	order_dict["created_at"] = datetime.utcnow()
-	result = db["orders"].insert_one(order_dict)
+
+	# Flash-sale products are admitted in memory first, so sold-out requests never reach Mongo
+	admitted = flash_sale_service.admit(order_dict["items"])
+	try:
+		# Take stock for every line (raises ValueError when a product runs short)
+		reserve_stock(order_dict["items"])
+	except Exception:
+		flash_sale_service.release(admitted)
+		raise
+	order_dict.update(reservation_fields(order_dict.get("payment_method"), order_dict["created_at"]))
+	try:
+		result = db["orders"].insert_one(order_dict)
+	except Exception:
+		release_items(order_dict["items"])
+		flash_sale_service.release(admitted)
+		raise
 	return get_order_by_id(str(result.inserted_id), user_id)
 
-def get_user_orders(user_id):
-	orders = list(db["orders"].find({"user_id": user_id}))
-	order_list = []
-	for order in orders:
-		order_item = {
-			"id": str(order.get("_id")),
-			"user_id": order.get("user_id", ""),
-			"total": order.get("total", 0.0),
-			"status": order.get("status", "pending"),
-			"payment_status": order.get("payment_status", "unpaid"),
-			"payment_method": order.get("payment_method", "cod"),
-			"shipping_address": order.get("shipping_address", {}),
-			"created_at": order.get("created_at"),
-			"item_count": len(order.get("items", []))
-		}
-		order_list.append(order_item)
-	return order_list
+async def get_user_orders_async(user_id, fields=None):
+	"""A user's orders, optionally limited to fields (see ORDER_LIST_FIELDS)"""
+	orders = await async_db["orders"].find({"user_id": user_id}, _order_list_projection(fields)).to_list(length=None)
+	return [select_fields(_format_order_list_item(order), fields) for order in orders]
 
 def get_order_by_id(order_id, user_id):
 	order = db["orders"].find_one({"_id": ObjectId(order_id), "user_id": user_id})
 	if not order:
 		return None
-	
-	# Enrich items with product images
-	items = order.get("items", [])
-	enriched_items = []
-	for item in items:
-		enriched_item = dict(item)
-		# Fetch product image if not already present
-		if "product_image" not in enriched_item or not enriched_item.get("product_image"):
-			product_id = item.get("product_id")
-			if product_id:
-				product = db["products"].find_one({"_id": ObjectId(product_id)})
-				if product:
-					image_urls = product.get("image_urls", [])
-					enriched_item["product_image"] = image_urls[0] if image_urls else None
-		enriched_items.append(enriched_item)
-	
-	response = {
-		"id": str(order.get("_id")),
-		"user_id": order.get("user_id", ""),
-		"items": enriched_items,
-		"subtotal": order.get("subtotal", 0.0),
-		"shipping_cost": order.get("shipping_cost", 0.0),
-		"discount_amount": order.get("discount_amount", 0.0),
-		"coupon_code": order.get("coupon_code", None),
-		"total": order.get("total", 0.0),
-		"shipping_address": order.get("shipping_address", {}),
-		"payment_method": order.get("payment_method", "cod"),
-		"status": order.get("status", "pending"),
-		"payment_status": order.get("payment_status", "unpaid"),
-		"created_at": order.get("created_at"),
-		"item_count": len(order.get("items", []))
-	}
-	return response
+	return _format_order(order, _load_order_items(order))
+
+async def get_order_by_id_async(order_id, user_id):
+	order = await async_db["orders"].find_one({"_id": ObjectId(order_id), "user_id": user_id})
+	if not order:
+		return None
+	return _format_order(order, await _load_order_items_async(order))
 
-def get_order_by_id_admin(order_id):
+async def get_order_by_id_admin_async(order_id):
 	"""Get order by ID for admin - no user_id restriction"""
-	order = db["orders"].find_one({"_id": ObjectId(order_id)})
+	order = await async_db["orders"].find_one({"_id": ObjectId(order_id)})
 	if not order:
 		return None
-	
-	# Enrich items with product images
-	items = order.get("items", [])
-	enriched_items = []
-	for item in items:
-		enriched_item = dict(item)
-		# Fetch product image if not already present
-		if "product_image" not in enriched_item or not enriched_item.get("product_image"):
-			product_id = item.get("product_id")
-			if product_id:
-				product = db["products"].find_one({"_id": ObjectId(product_id)})
-				if product:
-					image_urls = product.get("image_urls", [])
-					enriched_item["product_image"] = image_urls[0] if image_urls else None
-		enriched_items.append(enriched_item)
-	
-	response = {
-		"id": str(order.get("_id")),
-		"user_id": order.get("user_id", ""),
-		"items": enriched_items,
-		"subtotal": order.get("subtotal", 0.0),
-		"shipping_cost": order.get("shipping_cost", 0.0),
-		"discount_amount": order.get("discount_amount", 0.0),
-		"coupon_code": order.get("coupon_code", None),
-		"total": order.get("total", 0.0),
-		"shipping_address": order.get("shipping_address", {}),
-		"payment_method": order.get("payment_method", "cod"),
-		"status": order.get("status", "pending"),
-		"payment_status": order.get("payment_status", "unpaid"),
-		"created_at": order.get("created_at"),
-		"item_count": len(order.get("items", []))
-	}
-	return response
+	return _format_order(order, await _load_order_items_async(order))
+
+def _releasable(conditions=None):
+	# Orders whose goods have not left yet; cancelling one of these gives its stock back
+	return {**(conditions or {}), "status": {"$in": list(RELEASABLE_STATUSES)}}
 
-def cancel_order(order_id, user_id):
-	result = db["orders"].update_one(
+async def cancel_order_async(order_id, user_id):
+	# Cancel and restock in one update while the order can still be restocked
+	if await release_order_stock_async(order_id, {"status": "cancelled"}, _releasable({"user_id": user_id})):
+		return await get_order_by_id_async(order_id, user_id)
+	result = await async_db["orders"].update_one(
 		{"_id": ObjectId(order_id), "user_id": user_id},
 		{"$set": {"status": "cancelled"}}
 	)
 	if result.modified_count:
-		return get_order_by_id(order_id, user_id)
+		return await get_order_by_id_async(order_id, user_id)
 	return None
 
-def get_all_orders(status_filter=None, limit=50):
+async def get_all_orders_async(status_filter=None, limit=50, fields=None):
+	"""All orders for admins, optionally limited to fields (see ORDER_LIST_FIELDS)"""
 	query = {}
 	if status_filter:
 		query["status"] = status_filter
-	orders = list(db["orders"].find(query).limit(limit))
-	order_list = []
-	for order in orders:
-		order_item = {
-			"id": str(order.get("_id")),
-			"user_id": order.get("user_id", ""),
-			"total": order.get("total", 0.0),
-			"status": order.get("status", "pending"),
-			"payment_status": order.get("payment_status", "unpaid"),
-			"payment_method": order.get("payment_method", ""),
-			"shipping_address": order.get("shipping_address", {}),
-			"created_at": order.get("created_at"),
-			"item_count": len(order.get("items", []))
-		}
-		order_list.append(order_item)
-	return order_list
-
-def update_order_status(order_id, status):
-	result = db["orders"].update_one(
-		{"_id": ObjectId(order_id)},
-		{"$set": {"status": status}}
-	)
+	orders = await async_db["orders"].find(query, _order_list_projection(fields)).limit(limit).to_list(length=None)
+	return [select_fields(_format_order_list_item(order, default_payment_method=""), fields) for order in orders]
+
+def _status_query(order_id, status):
+	query = {"_id": ObjectId(order_id)}
+	if status != "cancelled":
+		# A cancelled order's stock may already be sold again, so it cannot be reopened
+		query["status"] = {"$ne": "cancelled"}
+	return query
+
+_REOPEN_ERROR = "A cancelled order cannot be reopened; place a new order instead"
+
+async def update_order_status_async(order_id, status):
+	"""Raises ValueError when asked to move a cancelled order to another status"""
+	if status == "cancelled" and await release_order_stock_async(order_id, {"status": status}, _releasable()):
+		return await get_order_by_id_admin_async(order_id)
+	result = await async_db["orders"].update_one(_status_query(order_id, status), {"$set": {"status": status}})
 	if result.modified_count:
-		return get_order_by_id_admin(order_id)
+		return await get_order_by_id_admin_async(order_id)
+	if status != "cancelled" and await async_db["orders"].count_documents({"_id": ObjectId(order_id), "status": "cancelled"}):
+		raise ValueError(_REOPEN_ERROR)
 	return None
 
-def get_payment_statistics():
-	"""Calculate payment statistics for admin dashboard"""
-	orders = list(db["orders"].find())
-	
+def _payment_statistics(orders):
 	total_revenue = sum(order.get("total", 0) for order in orders)
 	unpaid_orders = [o for o in orders if o.get("payment_status") == "unpaid"]
 	paid_orders = [o for o in orders if o.get("payment_status") == "paid"]
@@ -279,13 +298,25 @@ def get_payment_statistics():
 		"refunded_count": len(refunded_orders)
 	}
 
-def update_payment_status(order_id, payment_status):
-	result = db["orders"].update_one(
+async def get_payment_statistics_async():
+	"""Calculate payment statistics for admin dashboard"""
+	cursor = async_db["orders"].find({}, {"total": 1, "payment_status": 1})
+	return _payment_statistics(await cursor.to_list(length=None))
+
+def _payment_update(payment_status):
+	update = {"payment_status": payment_status}
+	if payment_status == "paid":
+		# A paid order keeps its stock; stop the unpaid reservation from expiring
+		update["reservation_expires_at"] = None
+	return {"$set": update}
+
+async def update_payment_status_async(order_id, payment_status):
+	result = await async_db["orders"].update_one(
 		{"_id": ObjectId(order_id)},
-		{"$set": {"payment_status": payment_status}}
+		_payment_update(payment_status)
 	)
 	if result.modified_count:
-		return get_order_by_id_admin(order_id)
+		return await get_order_by_id_admin_async(order_id)
 	return None
 
 db = client['beads_db']  # Use your DB name here
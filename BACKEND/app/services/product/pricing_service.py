@@ -0,0 +1,159 @@
+from app.core.database import client
+from app.services.product.offer_cache import get_active_offers_by_id
+from app.services.product.product_references import product_offer_ids, offer_name, with_names
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from app.core.etag import bump_version
+from app.services.utility import notification_service
+
+db = client['beads_db']
+
+
+def _original_price(product):
+    return product.get("original_price", product.get("price", 0.0))
+
+
+def price_products(products):
+    """
+    Price a page of raw product documents in one pass.
+    Offers for the whole page are resolved from a single offer lookup, then
+    discounts are computed column by column: one vector of original prices,
+    one vector of best discounts, updated offer by offer in priority order.
+    Returns: list of (final_price, applied_discount, applied_offer id) in input order
+    """
+    original_prices = [_original_price(product) for product in products]
+    count = len(original_prices)
+
+    # Manual discount is the starting best discount; an offer only wins if strictly better
+    best_discounts = [0.0] * count
+    applied_discounts = [None] * count
+    applied_offers = [None] * count
+    for i, product in enumerate(products):
+        manual_discount = product.get("discount_price")
+        if manual_discount and manual_discount > 0:
+            best_discounts[i] = manual_discount
+            applied_discounts[i] = manual_discount
+
+    # Which products carry each offer
+    members_by_offer = {}
+    for i, product in enumerate(products):
+        if not original_prices[i] or original_prices[i] <= 0:
+            continue
+        for offer_id in product_offer_ids(product):
+            members_by_offer.setdefault(offer_id, []).append(i)
+
+    # Active offers arrive highest priority first, so ties keep the higher priority offer
+    for offer_id, offer in get_active_offers_by_id().items():
+        members = members_by_offer.get(offer_id)
+        if not members:
+            continue
+        discount_value = offer.get('discount_value', 0)
+        if offer.get('discount_type', 'percentage') == 'percentage':
+            offer_discounts = [original_prices[i] * (discount_value / 100) for i in members]
+        else:  # fixed
+            offer_discounts = [discount_value] * len(members)
+        for i, offer_discount in zip(members, offer_discounts):
+            if offer_discount > best_discounts[i]:
+                best_discounts[i] = offer_discount
+                applied_discounts[i] = offer_discount
+                applied_offers[i] = offer_id
+
+    results = []
+    for i, original_price in enumerate(original_prices):
+        if not original_price or original_price <= 0:
+            results.append((original_price, None, None))
+            continue
+        # Ensure price doesn't go negative
+        final_price = max(0, original_price - best_discounts[i])
+        results.append((round(final_price, 2), applied_discounts[i], applied_offers[i]))
+    return results
+
+
+def apply_pricing(products):
+    """Price raw product documents in place, for endpoints that return them as stored (with names resolved)"""
+    for product, (final_price, applied_discount, applied_offer) in zip(products, price_products(products)):
+        with_names(product)
+        product["original_price"] = _original_price(product)
+        product["price"] = final_price
+        product["applied_discount"] = applied_discount
+        product["applied_offer"] = offer_name(applied_offer)
+    return products
+
+
+# Fields price_products needs, plus the materialized results to compare against
+PRICING_PROJECTION = {
+    "original_price": 1,
+    "price": 1,
+    "discount_price": 1,
+    "offers": 1,
+    "offer_ids": 1,
+    "effective_price": 1,
+    "applied_offer": 1
+}
+
+
+def effective_price_fields(product):
+    """Materialized pricing fields for a product document about to be written"""
+    final_price, _, applied_offer = price_products([product])[0]
+    return {"effective_price": final_price, "applied_offer": applied_offer}
+
+
+def _write_effective_prices(products):
+    operations = []
+    price_drops = []
+    for product, (final_price, _, applied_offer) in zip(products, price_products(products)):
+        if ("effective_price" not in product
+                or product["effective_price"] != final_price
+                or product.get("applied_offer") != applied_offer):
+            operations.append(UpdateOne(
+                {"_id": product["_id"]},
+                {"$set": {"effective_price": final_price, "applied_offer": applied_offer}}
+            ))
+            # e.g. an offer starting; wishlists opted in to sales hear about it
+            if final_price < product.get("effective_price", final_price):
+                price_drops.append(product["_id"])
+    if not operations:
+        return 0
+    bump_version("products")
+    modified = db["products"].bulk_write(operations, ordered=False).modified_count
+    notification_service.notify_sale(price_drops)
+    return modified
+
+
+def refresh_effective_prices(query, batch_size=500):
+    """
+    Recompute effective_price/applied_offer for every product matching query.
+    Products are streamed in batches and only changed documents are written.
+    Returns: number of products updated
+    """
+    modified = 0
+    batch = []
+    for product in db["products"].find(query, PRICING_PROJECTION).batch_size(batch_size):
+        batch.append(product)
+        if len(batch) >= batch_size:
+            modified += _write_effective_prices(batch)
+            batch = []
+    if batch:
+        modified += _write_effective_prices(batch)
+    return modified
+
+
+def find_priced_products(product_ids):
+    """
+    Fetch products by id with one query and price them as a batch
+    Returns: {product_id: (product, (final_price, applied_discount, applied_offer id))}
+    """
+    lookup_ids = []
+    for product_id in set(product_ids):
+        try:
+            lookup_ids.append(ObjectId(product_id))
+        except (InvalidId, TypeError):
+            lookup_ids.append(product_id)
+    if not lookup_ids:
+        return {}
+    products = list(db["products"].find({"_id": {"$in": lookup_ids}}))
+    return {
+        str(product["_id"]): (product, pricing)
+        for product, pricing in zip(products, price_products(products))
+    }
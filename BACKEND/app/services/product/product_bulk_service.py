@@ -0,0 +1,256 @@
+import csv
+import io
+import json
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.core.database import client
+from app.core.etag import bump_version
+from app.schemas.product.product_schemas import CreateProduct
+from app.services.product.category_service import collection as category_collection, adjust_product_counts
+from app.services.product.product_service import new_product_document, price_update_fields
+from app.services.product.pricing_service import PRICING_PROJECTION
+from app.services.product import suggest_service
+from app.services.product.product_references import with_names
+from app.services.utility import notification_service
+
+db = client['beads_db']
+products_collection = db['products']
+
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+MAX_BULK_UPDATE_ITEMS = 1000
+
+# Columns of the import/export format; list columns are '|' separated in CSV
+PRODUCT_FILE_COLUMNS = [
+    "name", "description", "price", "discount_price", "currency", "stock_quantity",
+    "category", "subcategory", "tags", "offers", "image_urls", "is_available"
+]
+_LIST_COLUMNS = ("tags", "offers", "image_urls")
+
+# Nullable CreateProduct fields a row may leave out
+_IMPORT_DEFAULTS = {
+    "discount_price": None,
+    "stock_quantity": 0,
+    "category": None,
+    "subcategory": None,
+    "is_available": True
+}
+
+
+def _csv_rows(text_stream):
+    for row in csv.DictReader(text_stream):
+        parsed = {}
+        for column, value in row.items():
+            if column is None or value is None:
+                continue
+            value = value.strip()
+            if column in _LIST_COLUMNS:
+                parsed[column] = [part.strip() for part in value.split("|") if part.strip()]
+            elif value != "":
+                parsed[column] = value
+        yield parsed
+
+
+def _ndjson_rows(text_stream):
+    for line in text_stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            # Reported against the row, the rest of the file still imports
+            yield e
+
+
+def _validation_message(error):
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+
+def import_products(text_stream, file_format):
+    """
+    Import products from a CSV or NDJSON text stream.
+    Rows are validated against CreateProduct, categories are resolved once up front,
+    and valid rows are inserted with insert_many in batches of IMPORT_BATCH_SIZE.
+    Returns: {"inserted": n, "failed": n, "errors": [{"row": n, "error": str}]}
+    """
+    rows = _csv_rows(text_stream) if file_format == "csv" else _ndjson_rows(text_stream)
+    categories = {category["name"]: category.get("path", []) for category in category_collection.find({}, {"name": 1, "path": 1})}
+    report = {"inserted": 0, "failed": 0, "errors": []}
+
+    def add_error(row_number, message):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_number, "error": message})
+
+    def flush(documents, row_numbers):
+        failed_indexes = set()
+        try:
+            result = products_collection.insert_many(documents, ordered=False)
+            report["inserted"] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            report["inserted"] += e.details.get("nInserted", 0)
+            for write_error in e.details.get("writeErrors", []):
+                failed_indexes.add(write_error["index"])
+                add_error(row_numbers[write_error["index"]], write_error.get("errmsg", "Insert failed"))
+        inserted = [document for i, document in enumerate(documents) if i not in failed_indexes]
+        suggest_service.index_products(inserted)
+        category_counts = {}
+        for document in inserted:
+            category_counts[document["category_id"]] = category_counts.get(document["category_id"], 0) + 1
+        adjust_product_counts(category_counts)
+
+    documents, row_numbers = [], []
+    for row_number, row in enumerate(rows, start=1):
+        if isinstance(row, Exception):
+            add_error(row_number, f"Invalid JSON: {row}")
+            continue
+        if not isinstance(row, dict):
+            add_error(row_number, "Row must be an object")
+            continue
+        try:
+            product = CreateProduct(**{**_IMPORT_DEFAULTS, **row})
+        except ValidationError as e:
+            add_error(row_number, _validation_message(e))
+            continue
+        if product.category not in categories:
+            add_error(row_number, f"Category does not exist: {product.category}")
+            continue
+        try:
+            document = new_product_document(product)
+        except ValueError as e:
+            add_error(row_number, str(e))
+            continue
+        document["category_path"] = categories[product.category]
+        documents.append(document)
+        row_numbers.append(row_number)
+        if len(documents) >= IMPORT_BATCH_SIZE:
+            flush(documents, row_numbers)
+            documents, row_numbers = [], []
+    if documents:
+        flush(documents, row_numbers)
+
+    if report["inserted"]:
+        bump_version("products")
+    return report
+
+
+def _export_row(product):
+    with_names(product)
+    row = {column: product.get(column) for column in PRODUCT_FILE_COLUMNS}
+    # The file carries the base price so an export can be imported again
+    row["price"] = product.get("original_price", product.get("price"))
+    row["id"] = str(product["_id"])
+    return row
+
+
+def export_products(file_format):
+    """
+    Stream the catalog as CSV or NDJSON lines, one product at a time from a
+    batched cursor, so the catalog is never held in memory
+    """
+    projection = {column: 1 for column in PRODUCT_FILE_COLUMNS}
+    projection.update({"original_price": 1, "category_id": 1, "offer_ids": 1})
+    cursor = products_collection.find({}, projection).sort("_id", 1).batch_size(IMPORT_BATCH_SIZE)
+
+    if file_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=["id"] + PRODUCT_FILE_COLUMNS)
+        writer.writeheader()
+        yield buffer.getvalue()
+        for product in cursor:
+            buffer.seek(0)
+            buffer.truncate()
+            row = _export_row(product)
+            for column in _LIST_COLUMNS:
+                row[column] = "|".join(row[column] or [])
+            writer.writerow(row)
+            yield buffer.getvalue()
+    else:
+        for product in cursor:
+            yield json.dumps(_export_row(product), default=str) + "\n"
+
+
+def _bulk_object_ids(updates):
+    """Split updates into ({ObjectId: [updates]}, [unparseable ids]), checking the batch size"""
+    if len(updates) > MAX_BULK_UPDATE_ITEMS:
+        raise ValueError(f"At most {MAX_BULK_UPDATE_ITEMS} products per request")
+    by_id, invalid = {}, []
+    for update in updates:
+        try:
+            by_id.setdefault(ObjectId(update.product_id), []).append(update)
+        except (InvalidId, TypeError):
+            invalid.append(update.product_id)
+    return by_id, invalid
+
+
+def _run_bulk(operations, not_found):
+    summary = {"matched": 0, "modified": 0, "not_found": not_found}
+    if not operations:
+        return summary
+    result = products_collection.bulk_write(operations, ordered=False)
+    summary["matched"] = result.matched_count
+    summary["modified"] = result.modified_count
+    bump_version("products")
+    return summary
+
+
+def bulk_update_stock(updates):
+    """
+    Set stock_quantity for many products with one unordered bulk_write.
+    Only currently out-of-stock products are read first, to queue restock
+    notifications; when a product appears more than once the last entry wins.
+    Returns: {"matched": n, "modified": n, "not_found": [product ids]}
+    """
+    by_id, invalid = _bulk_object_ids(updates)
+    # Only out-of-stock products matter for restock notifications
+    out_of_stock = products_collection.find(
+        {"_id": {"$in": list(by_id)}, "stock_quantity": {"$not": {"$gt": 0}}}, {"_id": 1}
+    )
+    restocked = [product["_id"] for product in out_of_stock if by_id[product["_id"]][-1].stock_quantity > 0]
+    operations = [
+        UpdateOne({"_id": object_id}, {"$set": {"stock_quantity": entries[-1].stock_quantity}})
+        for object_id, entries in by_id.items()
+    ]
+    summary = _run_bulk(operations, invalid)
+    notification_service.notify_restock(restocked)
+    if summary["matched"] < len(operations):
+        found = {product["_id"] for product in products_collection.find({"_id": {"$in": list(by_id)}}, {"_id": 1})}
+        summary["not_found"] += [str(object_id) for object_id in by_id if object_id not in found]
+    return summary
+
+
+def bulk_update_price(updates):
+    """
+    Apply price/discount/currency changes to many products.
+    The affected products are read with one query, each update goes through the
+    same rules as update_product_price (entries for one product apply in order),
+    and all writes, including effective_price, go out in one unordered bulk_write.
+    Returns: {"matched": n, "modified": n, "not_found": [product ids]}
+    """
+    by_id, invalid = _bulk_object_ids(updates)
+    projection = {**PRICING_PROJECTION, "currency": 1}
+    products = {
+        product["_id"]: product
+        for product in products_collection.find({"_id": {"$in": list(by_id)}}, projection)
+    }
+    not_found = invalid + [str(object_id) for object_id in by_id if object_id not in products]
+
+    operations = []
+    price_drops = []
+    for object_id, product in products.items():
+        update_data = {}
+        for price_update in by_id[object_id]:
+            update_data.update(price_update_fields({**product, **update_data}, price_update))
+        operations.append(UpdateOne({"_id": object_id}, {"$set": update_data}))
+        if update_data["effective_price"] < product.get("effective_price", update_data["effective_price"]):
+            price_drops.append(object_id)
+    summary = _run_bulk(operations, not_found)
+    notification_service.notify_sale(price_drops)
+    return summary
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from app.core.database import async_client
+from app.services.product.offer_cache import get_active_offers_by_id
+from app.services.product.product_references import category_filter, product_offer_ids
+from app.services.product.product_service import format_products, product_projection
+from app.services.product.review_service import get_approved_reviews_async
+from app.core.projection import select_fields
+
+async_db = async_client['beads_db']
+
+PAGE_REVIEW_LIMIT = 10
+RELATED_PRODUCT_LIMIT = 6
+# Card fields for the "more from this category" strip
+RELATED_PRODUCT_FIELDS = [
+    "id", "name", "image_urls", "original_price", "price", "applied_discount",
+    "applied_offer", "currency", "is_available", "ratings", "review_count"
+]
+
+
+async def _related_products(product_task, limit):
+    product = await product_task
+    if not product:
+        return []
+    if product.get("category_id"):
+        # May read the migration state from Mongo on a cache miss, so it runs off the event loop
+        query = await asyncio.to_thread(category_filter, product["category_id"])
+    elif product.get("category"):
+        query = {"category": product["category"]}
+    else:
+        return []
+    query.update({"is_available": True, "_id": {"$ne": product["_id"]}})
+    cursor = async_db["products"].find(query, product_projection(RELATED_PRODUCT_FIELDS)).limit(limit)
+    return await cursor.to_list(length=None)
+
+
+def _rating_histogram(product):
+    # Maintained on the product by review_service, keyed by star as a string
+    stored = product.get("rating_histogram") or {}
+    return {rating: stored.get(str(rating), 0) for rating in range(1, 6)}
+
+
+def _format_page_products(product, related):
+    # Pricing and category/offer names come from caches that reload from Mongo with sync calls
+    formatted_product, *formatted_related = format_products([product] + related)
+    return formatted_product, formatted_related, product_offer_ids(product)
+
+
+def _format_offer(offer):
+    # Cached offer documents are shared, so format a copy
+    return {**offer, "_id": str(offer["_id"]), "created_at": offer.get("created_at", datetime.min)}
+
+
+async def get_product_page(product_id, review_limit=PAGE_REVIEW_LIMIT, related_limit=RELATED_PRODUCT_LIMIT):
+    """
+    Everything the product detail page renders, fetched concurrently:
+    the priced product (with its stored rating histogram), newest approved
+    reviews, the active offers on the product and a few products from its category.
+    Returns None when the product does not exist.
+    """
+    try:
+        object_id = ObjectId(product_id)
+    except (InvalidId, TypeError):
+        return None
+
+    product_task = asyncio.ensure_future(async_db["products"].find_one({"_id": object_id}))
+    # Related products wait on the product's category; everything else starts right away
+    product, reviews, active_offers, related = await asyncio.gather(
+        product_task,
+        get_approved_reviews_async(product_id, review_limit),
+        # Usually a cache hit; on a miss the sync lookup runs off the event loop
+        asyncio.to_thread(get_active_offers_by_id),
+        _related_products(product_task, related_limit)
+    )
+    if not product:
+        return None
+
+    # Cache misses there are sync lookups, so formatting runs off the event loop
+    formatted_product, formatted_related, product_offers = await asyncio.to_thread(
+        _format_page_products, product, related
+    )
+    return {
+        "product": formatted_product,
+        "reviews": reviews,
+        "rating_histogram": _rating_histogram(product),
+        "offers": [_format_offer(offer) for offer_id, offer in active_offers.items() if offer_id in product_offers],
+        "related_products": [select_fields(item, RELATED_PRODUCT_FIELDS) for item in formatted_related]
+    }
@@ -0,0 +1,223 @@
+"""
+Id-based category and offer references on products.
+
+Products store category_id and offer_ids (string ids) instead of the
+category name and offer names, so renaming a category or offer writes only
+that one document. Names are resolved at read time from cached id -> name
+maps; the API still takes and returns names.
+
+Products written before the switch still carry category/offers names. A
+background job converts them online, walking products in _id order a batch
+at a time and checkpointing in job_state. Until it has finished,
+category_filter/offer_filter also match the legacy name fields, and reads
+fall back to the stored names. Run it from the command line with:
+
+    python -m app.services.product.product_references
+"""
+import time
+from datetime import datetime
+from pymongo import UpdateOne
+from app.core.database import client
+from app.core.cache import TTLCache
+from app.services.product.offer_cache import get_offer_names
+
+db = client['beads_db']
+products_collection = db['products']
+categories_collection = db['categories']
+offers_collection = db['offers']
+state_collection = db['job_state']
+
+# category_service invalidates on every write; the TTL covers writes from other workers
+REFERENCE_CACHE_TTL_SECONDS = 60
+# Unknown category names come from public filters, so they may reload the names at most this often
+CATEGORY_RELOAD_SECONDS = 5
+REFERENCE_MIGRATION_SECONDS = 30
+MIGRATION_BATCH_SIZE = 500
+_STATE_ID = 'product_references'
+
+_cache = TTLCache(ttl_seconds=REFERENCE_CACHE_TTL_SECONDS, max_entries=2)
+_categories_loaded_at = 0.0
+
+
+def get_category_names():
+    """All categories as {id: name}"""
+    global _categories_loaded_at
+    names = _cache.get('categories')
+    if names is None:
+        names = {str(cat['_id']): cat['name'] for cat in categories_collection.find({}, {'name': 1})}
+        _cache.set('categories', names)
+        _categories_loaded_at = time.monotonic()
+    return names
+
+
+def invalidate_category_names():
+    _cache.invalidate('categories')
+
+
+def _id_for_name(names, name, reload):
+    for ref_id, ref_name in names.items():
+        if ref_name == name:
+            return ref_id
+    # Created in another worker since the map was cached
+    for ref_id, ref_name in reload().items():
+        if ref_name == name:
+            return ref_id
+    return None
+
+
+def category_id_for(name):
+    """Id of the category called name, or None"""
+    if not name:
+        return None
+
+    def reload():
+        # A name nobody has must not cost a categories scan on every request
+        if time.monotonic() - _categories_loaded_at < CATEGORY_RELOAD_SECONDS:
+            return {}
+        invalidate_category_names()
+        return get_category_names()
+
+    return _id_for_name(get_category_names(), name, reload)
+
+
+def offer_ids_for(names):
+    """
+    Ids of the offers called names, in the same order.
+    Raises ValueError for a name no offer has.
+    """
+    offer_ids = []
+    for name in names or []:
+        offer_id = _id_for_name(get_offer_names(), name, lambda: get_offer_names(refresh=True))
+        if offer_id is None:
+            raise ValueError(f"Offer does not exist: {name}")
+        offer_ids.append(offer_id)
+    return offer_ids
+
+
+def category_name(product):
+    """Name of a product's category, from its category_id or a not yet migrated category name"""
+    if product.get('category_id'):
+        return get_category_names().get(product['category_id'], '')
+    return product.get('category', '')
+
+
+def product_offer_ids(product):
+    """Offer ids of a product, mapping the names of a not yet migrated product"""
+    if 'offer_ids' in product:
+        return product['offer_ids'] or []
+    ids_by_name = {name: offer_id for offer_id, name in get_offer_names().items()}
+    return [ids_by_name[name] for name in product.get('offers') or [] if name in ids_by_name]
+
+
+def offer_name(offer_id):
+    """Name of an offer id; values that are not known ids (legacy applied_offer names) pass through"""
+    if offer_id is None:
+        return None
+    return get_offer_names().get(offer_id, offer_id)
+
+
+def with_names(product):
+    """Set category and offers names on a raw product document in place"""
+    product['category'] = category_name(product)
+    if 'offer_ids' in product:
+        product['offers'] = [offer_name(offer_id) for offer_id in product['offer_ids'] or []]
+    return product
+
+
+def references_migrated():
+    """True once every product stores ids; cached, and never goes back to False"""
+    migrated = _cache.get('migrated')
+    if migrated is None:
+        state = state_collection.find_one({'_id': _STATE_ID}, {'done': 1}) or {}
+        migrated = bool(state.get('done'))
+        _cache.set('migrated', migrated)
+    return migrated
+
+
+def category_filter(category_id, name=None):
+    """
+    Products in one category; also matches products still storing the name until the migration is done.
+    A category_id of None (a name no category has) matches nothing once the migration is done.
+    """
+    legacy = name and not references_migrated()
+    if not category_id:
+        return {'category': name} if legacy else {'_id': {'$in': []}}
+    query = {'category_id': category_id}
+    if legacy:
+        return {'$or': [query, {'category': name}]}
+    return query
+
+
+def offer_filter(offer_ids, names=None):
+    """Products with any of the offers; also matches products still storing names until the migration is done"""
+    query = {'offer_ids': {'$in': list(offer_ids)}}
+    if names and not references_migrated():
+        return {'$or': [query, {'offers': {'$in': list(names)}}]}
+    return query
+
+
+def _reference_update(product, category_ids, offer_ids):
+    """$set/$unset moving one legacy product to id references, or None if nothing can move"""
+    update = {'$set': {}, '$unset': {}}
+    if 'category' in product and product['category'] in category_ids:
+        update['$set']['category_id'] = category_ids[product['category']]
+        update['$unset']['category'] = ''
+    if 'offers' in product:
+        # Names no offer has never priced anything; they are dropped
+        update['$set']['offer_ids'] = [offer_ids[name] for name in product['offers'] or [] if name in offer_ids]
+        update['$unset']['offers'] = ''
+        if product.get('applied_offer') in offer_ids:
+            update['$set']['applied_offer'] = offer_ids[product['applied_offer']]
+    if not update['$unset']:
+        return None
+    return {key: value for key, value in update.items() if value}
+
+
+def migrate_product_references(batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Convert products that still store category/offer names to ids, resuming
+    from the last checkpoint. Each update is conditional on the names it read,
+    so a product rewritten concurrently is left to the write that changed it.
+    Products whose category name matches no category keep that name.
+    Returns: number of products converted
+    """
+    state = state_collection.find_one({'_id': _STATE_ID}) or {}
+    if state.get('done'):
+        return 0
+    last_product_id = state.get('last_product_id')
+    category_ids = {cat['name']: str(cat['_id']) for cat in categories_collection.find({}, {'name': 1})}
+    offer_ids = {offer['name']: str(offer['_id']) for offer in offers_collection.find({}, {'name': 1})}
+    projection = {'category': 1, 'offers': 1, 'applied_offer': 1}
+
+    converted = 0
+    while True:
+        query = {'_id': {'$gt': last_product_id}} if last_product_id else {}
+        products = list(products_collection.find(query, projection).sort('_id', 1).limit(batch_size))
+        if not products:
+            break
+        operations = []
+        for product in products:
+            update = _reference_update(product, category_ids, offer_ids)
+            if update:
+                condition = {'_id': product['_id']}
+                for field in ('category', 'offers'):
+                    if field in product:
+                        condition[field] = product[field]
+                operations.append(UpdateOne(condition, update))
+        if operations:
+            converted += products_collection.bulk_write(operations, ordered=False).modified_count
+        last_product_id = products[-1]['_id']
+        state_collection.update_one(
+            {'_id': _STATE_ID},
+            {'$set': {'last_product_id': last_product_id, 'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+
+    # Products inserted from here on are written with ids
+    state_collection.update_one({'_id': _STATE_ID}, {'$set': {'done': True, 'finished_at': datetime.utcnow()}}, upsert=True)
+    _cache.invalidate('migrated')
+    return converted
+
+
+if __name__ == '__main__':
+    print(f"✅ Moved {migrate_product_references()} products to id references")
@@ -1,160 +1,271 @@
 from app.core.database import client
 from bson.objectid import ObjectId
 from datetime import datetime
-from app.services.product.category_service import collection as category_collection
+from app.services.product.category_service import collection as category_collection, adjust_product_counts
+from app.core.pagination import paginate, encode_cursor
+from app.core.projection import projection_for, select_fields
+from app.core.cache import TTLCache
+from app.core.etag import bump_version
+from app.services.product.pricing_service import price_products, effective_price_fields, refresh_effective_prices
+from app.services.product import suggest_service
+from app.services.product.product_references import (
+    category_name, category_id_for, category_filter, offer_name, offer_ids_for, get_category_names
+)
+from app.services.product.offer_cache import get_offer_names
+from app.services.utility import notification_service
+from pymongo import ReturnDocument
 
 db = client['beads_db']
-offers_collection = db['offers']
+
+# Fields a product response can contain; list endpoints accept a subset via ?fields=
+PRODUCT_FIELDS = (
+    "id", "name", "description", "image_urls", "original_price", "price", "discount_price",
+    "applied_discount", "applied_offer", "currency", "stock_quantity", "is_available",
+    "category", "subcategory", "tags", "offers", "ratings", "review_count", "created_at", "is_active"
+)
+# Response fields computed rather than read as stored; names are resolved from the stored ids
+_COMPUTED_PRODUCT_FIELDS = {
+    "applied_discount": [],
+    "applied_offer": [],
+    "category": ["category_id", "category"],
+    "offers": ["offer_ids", "offers"]
+}
+# Always fetched because pricing depends on them
+_PRICING_FIELDS = ("original_price", "price", "discount_price", "offer_ids", "offers")
+
+def product_projection(fields=None):
+    """Mongo projection for the requested response fields (default: the full product response)"""
+    return projection_for(fields or PRODUCT_FIELDS, _COMPUTED_PRODUCT_FIELDS, always=_PRICING_FIELDS)
 
 def calculate_best_discount(original_price, offers_list, manual_discount_amount=None):
     """
-    Calculate the best discount from manual discount and active offers
+    Calculate the best discount from manual discount and active offers (by name)
     Returns: (final_price, best_discount_amount, applied_offer_name)
     """
-    if not original_price or original_price <= 0:
-        return original_price, None, None
-    
-    best_price = original_price
-    best_discount_amount = None
-    best_offer_name = None
-    
-    # Check manual discount first
-    if manual_discount_amount and manual_discount_amount > 0:
-        manual_price = original_price - manual_discount_amount
-        if manual_price < best_price:
-            best_price = manual_price
-            best_discount_amount = manual_discount_amount
-    
-    # Check all offers
-    if offers_list:
-        # Fetch active offers from database
-        active_offers = list(offers_collection.find({
-            'name': {'$in': offers_list},
-            'is_active': True
-        }).sort('priority', -1))
-        
-        for offer in active_offers:
-            discount_type = offer.get('discount_type', 'percentage')
-            discount_value = offer.get('discount_value', 0)
-            
-            if discount_type == 'percentage':
-                offer_discount = original_price * (discount_value / 100)
-                offer_price = original_price - offer_discount
-            else:  # fixed
-                offer_discount = discount_value
-                offer_price = original_price - offer_discount
-            
-            # Keep best (lowest price)
-            if offer_price < best_price:
-                best_price = offer_price
-                best_discount_amount = offer_discount
-                best_offer_name = offer.get('name')
-    
-    # Ensure price doesn't go negative
-    best_price = max(0, best_price)
-    
-    return round(best_price, 2), best_discount_amount, best_offer_name
+    product = {
+        "original_price": original_price,
+        "discount_price": manual_discount_amount,
+        "offers": offers_list or []
+    }
+    final_price, best_discount, applied_offer = price_products([product])[0]
+    return final_price, best_discount, offer_name(applied_offer)
 
-def get_all_products(category=None, search=None, min_price=None, max_price=None, is_available=True, skip=0, limit=50):
+def format_product(product, final_price, applied_discount, applied_offer):
+    return {
+        "id": str(product.get("_id")),
+        "name": product.get("name", ""),
+        "description": product.get("description", ""),
+        "image_urls": product.get("image_urls", []),
+        "original_price": product.get("original_price", product.get("price", 0.0)),
+        "price": final_price,
+        "discount_price": product.get("discount_price", None),
+        "applied_discount": applied_discount,
+        "applied_offer": offer_name(applied_offer),
+        "currency": product.get("currency", "NPR"),
+        "stock_quantity": product.get("stock_quantity", 0),
+        "is_available": product.get("is_available", True),
+        "category": category_name(product),
+        "subcategory": product.get("subcategory", None),
+        "tags": product.get("tags", []),
+        "offers": [offer_name(offer_id) for offer_id in product["offer_ids"]] if "offer_ids" in product else product.get("offers", []),
+        "ratings": product.get("ratings", 0.0),
+        "review_count": product.get("review_count", 0),
+        "created_at": product.get("created_at", None),
+        "is_active": product.get("is_active", True)
+    }
+
+def format_products(products):
+    """Price a page of raw product documents in one batch and build their responses"""
+    return [
+        format_product(product, *pricing)
+        for product, pricing in zip(products, price_products(products))
+    ]
+
+def build_product_query(category=None, search=None, min_price=None, max_price=None, is_available=None):
     query = {}
     if category:
-        query["category"] = category
+        # Category names are resolved to ids; unknown names can only match products not yet migrated
+        query.update(category_filter(category_id_for(category), category))
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
+        # Uses the weighted product_search text index (name > tags > description)
+        query["$text"] = {"$search": search}
     if min_price is not None or max_price is not None:
+        # Filter on the materialized price customers actually pay
         price_query = {}
         if min_price is not None:
             price_query["$gte"] = min_price
         if max_price is not None:
             price_query["$lte"] = max_price
-        query["price"] = price_query
+        query["effective_price"] = price_query
     if is_available is not None:
         query["is_available"] = is_available
-    products = list(db["products"].find(query).skip(skip).limit(limit))
-    product_list = []
-    for product in products:
-        # Calculate dynamic pricing with offers
-        original_price = product.get("original_price", product.get("price", 0.0))
-        manual_discount = product.get("discount_price")
-        offers = product.get("offers", [])
-        
-        # Calculate best price considering manual discount and offers
-        final_price, applied_discount, applied_offer = calculate_best_discount(
-            original_price, offers, manual_discount
-        )
-        
-        product_response = {
-            "id": str(product.get("_id")),
-            "name": product.get("name", ""),
-            "description": product.get("description", ""),
-            "image_urls": product.get("image_urls", []),
-            "original_price": original_price,
-            "price": final_price,
-            "discount_price": product.get("discount_price", None),
-            "applied_discount": applied_discount,
-            "applied_offer": applied_offer,
-            "currency": product.get("currency", "NPR"),
-            "stock_quantity": product.get("stock_quantity", 0),
-            "is_available": product.get("is_available", True),
-            "category": product.get("category", ""),
-            "subcategory": product.get("subcategory", None),
-            "tags": product.get("tags", []),
-            "offers": offers,
-            "ratings": product.get("ratings", 0.0),
-            "review_count": product.get("review_count", 0),
-            "created_at": product.get("created_at", None),
-            "is_active": product.get("is_active", True)
-        }
-        product_list.append(product_response)
-    return product_list
+    return query
+
+# Catalog sort modes; every sort ends with _id so it is unique and can be paginated by cursor.
+# Each is backed by a (category_id, is_available, field, _id) and an (is_available, field, _id) index.
+PRODUCT_SORTS = {
+    "price_asc": [("effective_price", 1), ("_id", 1)],
+    "price_desc": [("effective_price", -1), ("_id", -1)],
+    "newest": [("_id", -1)],
+    "rating": [("ratings", -1), ("_id", -1)],
+    "popularity": [("review_count", -1), ("_id", -1)],
+}
+_DEFAULT_SORT = [("_id", 1)]
+
+def get_products_page(category=None, search=None, min_price=None, max_price=None, is_available=True, skip=0, limit=50, cursor=None, fields=None, sort=None):
+    """
+    One page of the catalog.
+    Browsing uses keyset pagination: pass the returned next_cursor (with the same sort)
+    to get the following page. skip is still honoured when no cursor is given. Search
+    results are ordered by relevance unless a sort is given, and paginate with skip only.
+    sort is one of PRODUCT_SORTS (default: insertion order); raises ValueError otherwise.
+    fields limits the returned (and fetched) fields, see PRODUCT_FIELDS.
+    Returns: {"items": [...], "next_cursor": str or None}
+    """
+    if sort is not None and sort not in PRODUCT_SORTS:
+        raise ValueError(f"Unknown sort: {sort}. Use one of {', '.join(PRODUCT_SORTS)}")
+    sort_fields = PRODUCT_SORTS[sort] if sort else _DEFAULT_SORT
+    query = build_product_query(category, search, min_price, max_price, is_available)
+    projection = product_projection(fields)
+    # The cursor is built from the sort key values
+    for field, _ in sort_fields:
+        if field != "_id":
+            projection[field] = 1
+    if search:
+        if sort:
+            search_cursor = db["products"].find(query, projection).sort(sort_fields)
+        else:
+            # Most relevant first
+            projection["score"] = {"$meta": "textScore"}
+            search_cursor = db["products"].find(query, projection).sort([("score", {"$meta": "textScore"})])
+        products = list(search_cursor.skip(skip).limit(limit))
+        items = [select_fields(product, fields) for product in format_products(products)]
+        return {"items": items, "next_cursor": None}
+    
+    if "is_available" not in query:
+        # Enumerating every value keeps the sort indexes usable: Mongo merges the
+        # already-sorted ranges instead of sorting the whole category in memory
+        query["is_available"] = {"$in": [True, False, None]}
+    if skip and not cursor:
+        products = list(db["products"].find(query, projection).sort(sort_fields).skip(skip).limit(limit + 1))
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            next_cursor = encode_cursor(products[-1], sort_fields)
+    else:
+        products, next_cursor = paginate(db["products"], query, sort_fields, limit, cursor, projection)
+    items = [select_fields(product, fields) for product in format_products(products)]
+    return {"items": items, "next_cursor": next_cursor}
+
+def get_all_products(category=None, search=None, min_price=None, max_price=None, is_available=True, skip=0, limit=50):
+    return get_products_page(category, search, min_price, max_price, is_available, skip, limit)["items"]
+
+# Facet counts are cached per normalized filter set for a short time
+FACET_CACHE_TTL_SECONDS = 30
+PRICE_BUCKET_BOUNDARIES = [0, 500, 1000, 2500, 5000, 10000, float("inf")]
+FACET_TAG_LIMIT = 30
+
+_facet_cache = TTLCache(ttl_seconds=FACET_CACHE_TTL_SECONDS, max_entries=512)
+
+def _named_counts(groups, names):
+    """[{name, count}] from $group rows keyed by id or legacy name, most common first"""
+    counts = {}
+    for group in groups:
+        name = names.get(group["_id"], group["_id"])
+        counts[name] = counts.get(name, 0) + group["count"]
+    return [{"name": name, "count": count} for name, count in sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))]
+
+def get_product_facets(category=None, search=None, min_price=None, max_price=None, is_available=None):
+    """
+    Counts per category, price bucket, tag, offer and stock state for the products
+    matching the current filters, computed with a single $facet aggregation
+    """
+    search = search.strip().lower() if search else None
+    cache_key = (category, search, min_price, max_price, is_available)
+    facets = _facet_cache.get(cache_key)
+    if facets is not None:
+        return facets
+    
+    query = build_product_query(category, search, min_price, max_price, is_available)
+    pipeline = [
+        {"$match": query},
+        {"$facet": {
+            # Grouped by id; products not yet migrated group by their stored name
+            "categories": [
+                {"$group": {"_id": {"$ifNull": ["$category_id", "$category"]}, "count": {"$sum": 1}}}
+            ],
+            "price_buckets": [
+                {"$bucket": {
+                    "groupBy": "$effective_price",
+                    "boundaries": PRICE_BUCKET_BOUNDARIES,
+                    "default": "unpriced",
+                    "output": {"count": {"$sum": 1}}
+                }}
+            ],
+            "tags": [
+                {"$unwind": "$tags"},
+                {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+                {"$limit": FACET_TAG_LIMIT}
+            ],
+            "offers": [
+                {"$project": {"offer_refs": {"$ifNull": ["$offer_ids", "$offers"]}}},
+                {"$unwind": "$offer_refs"},
+                {"$group": {"_id": "$offer_refs", "count": {"$sum": 1}}}
+            ],
+            "stock": [
+                {"$group": {"_id": {"$gt": ["$stock_quantity", 0]}, "count": {"$sum": 1}}}
+            ]
+        }}
+    ]
+    result = next(db["products"].aggregate(pipeline), {})
+    
+    boundaries = PRICE_BUCKET_BOUNDARIES
+    price_buckets = []
+    for bucket in result.get("price_buckets", []):
+        if bucket["_id"] == "unpriced":
+            continue
+        upper = boundaries[boundaries.index(bucket["_id"]) + 1]
+        price_buckets.append({
+            "min": bucket["_id"],
+            "max": None if upper == float("inf") else upper,
+            "count": bucket["count"]
+        })
+    stock = {bucket["_id"]: bucket["count"] for bucket in result.get("stock", [])}
+    
+    facets = {
+        "categories": _named_counts(result.get("categories", []), get_category_names()),
+        "price_buckets": price_buckets,
+        "tags": [{"name": t["_id"], "count": t["count"]} for t in result.get("tags", [])],
+        "offers": _named_counts(result.get("offers", []), get_offer_names()),
+        "in_stock": stock.get(True, 0),
+        "out_of_stock": stock.get(False, 0)
+    }
+    _facet_cache.set(cache_key, facets)
+    return facets
 
 def get_product_by_id(product_id):
     product = db["products"].find_one({"_id": ObjectId(product_id)})
     if product:
-        # Calculate dynamic pricing with offers
-        original_price = product.get("original_price", product.get("price", 0.0))
-        manual_discount = product.get("discount_price")
-        offers = product.get("offers", [])
-        
-        # Calculate best price considering manual discount and offers
-        final_price, applied_discount, applied_offer = calculate_best_discount(
-            original_price, offers, manual_discount
-        )
-        
-        product_response = {
-            "id": str(product.get("_id")),
-            "name": product.get("name", ""),
-            "description": product.get("description", ""),
-            "image_urls": product.get("image_urls", []),
-            "original_price": original_price,
-            "price": final_price,
-            "discount_price": product.get("discount_price", None),
-            "applied_discount": applied_discount,
-            "applied_offer": applied_offer,
-            "currency": product.get("currency", "NPR"),
-            "stock_quantity": product.get("stock_quantity", 0),
-            "is_available": product.get("is_available", True),
-            "category": product.get("category", ""),
-            "subcategory": product.get("subcategory", None),
-            "tags": product.get("tags", []),
-            "offers": offers,
-            "ratings": product.get("ratings", 0.0),
-            "review_count": product.get("review_count", 0),
-            "created_at": product.get("created_at", None),
-            "is_active": product.get("is_active", True)
-        }
-        return product_response
+        return format_products([product])[0]
     return None
 
-def create_product(product_data):
+def new_product_document(product_data):
+    """
+    Build the stored document for a CreateProduct, including materialized pricing.
+    The category and offer names are stored as ids; raises ValueError for unknown names.
+    """
     product_dict = product_data.dict()
+    product_dict["category_id"] = category_id_for(product_dict.pop("category", None))
+    if not product_dict["category_id"]:
+        raise ValueError("Category does not exist.")
+    product_dict["offer_ids"] = offer_ids_for(product_dict.pop("offers", None))
     product_dict["created_at"] = product_dict.get("created_at") or datetime.utcnow()
     product_dict["is_active"] = product_dict.get("is_active", True)
     product_dict["ratings"] = product_dict.get("ratings", 0.0)
     product_dict["review_count"] = product_dict.get("review_count", 0)
+    product_dict["rating_sum"] = product_dict.get("rating_sum", 0)
+    product_dict["rating_histogram"] = product_dict.get("rating_histogram", {})
     
     # Set original_price from price field (this is the fixed base price)
     original_price = product_dict.get("price", 0.0)
@@ -169,30 +280,67 @@ def create_product(product_data):
         # No discount or invalid discount
         product_dict["price"] = original_price
         product_dict["discount_price"] = None
+    
+    product_dict.update(effective_price_fields(product_dict))
+    return product_dict
+
+def create_product(product_data):
+    product_dict = new_product_document(product_data)
 
-    # Validate category name exists
-    category_doc = category_collection.find_one({"name": product_dict["category"]})
+    # Validate category still exists
+    category_doc = category_collection.find_one({"_id": ObjectId(product_dict["category_id"])}, {"path": 1})
     if not category_doc:
         raise ValueError("Category does not exist.")
+    product_dict["category_path"] = category_doc.get("path", [])
     result = db["products"].insert_one(product_dict)
+    bump_version("products")
+    adjust_product_counts({product_dict["category_id"]: 1})
+    suggest_service.index_products([product_dict])
     return get_product_by_id(str(result.inserted_id))
 
 def update_product(product_id, product_update):
-    result = db["products"].update_one(
+    update_data = product_update.dict(exclude_unset=True)
+    # Names come in, ids are stored; the legacy name fields go once a product is rewritten
+    legacy_fields = {}
+    if "category" in update_data:
+        category_doc = category_collection.find_one({"name": update_data.pop("category")}, {"path": 1})
+        if not category_doc:
+            raise ValueError("Category does not exist.")
+        update_data["category_id"] = str(category_doc["_id"])
+        update_data["category_path"] = category_doc.get("path", [])
+        legacy_fields["category"] = ""
+    if "offers" in update_data:
+        update_data["offer_ids"] = offer_ids_for(update_data.pop("offers"))
+        legacy_fields["offers"] = ""
+    update = {"$set": update_data}
+    if legacy_fields:
+        update["$unset"] = legacy_fields
+    before = db["products"].find_one_and_update(
         {"_id": ObjectId(product_id)},
-        {"$set": product_update.dict(exclude_unset=True)}
+        update,
+        projection={"category_id": 1, "category": 1},
+        return_document=ReturnDocument.BEFORE
     )
-    # Return product even if nothing was modified (matched_count > 0 means product exists)
-    if result.matched_count:
+    # Return product even if nothing was modified (a previous document means product exists)
+    if before:
+        bump_version("products")
+        if "category_id" in update_data:
+            old_category_id = before.get("category_id") or category_id_for(before.get("category"))
+            if old_category_id != update_data["category_id"]:
+                adjust_product_counts({old_category_id: -1, update_data["category_id"]: 1})
+        if "offer_ids" in update_data:
+            refresh_effective_prices({"_id": ObjectId(product_id)})
+        if update_data.keys() & suggest_service.SUGGEST_PROJECTION.keys():
+            suggest_service.reindex_product(ObjectId(product_id))
         return get_product_by_id(product_id)
     return None
 
-def update_product_price(product_id, price_update):
-    # Get current product to access original_price
-    product = db["products"].find_one({"_id": ObjectId(product_id)})
-    if not product:
-        return None
-    
+def price_update_fields(product, price_update):
+    """
+    $set fields for applying price_update to a stored product document.
+    original_price only changes when a different price is given; price is always
+    original_price minus a discount_price that is positive and below it.
+    """
     update_data = {}
     
     # Get the original price (never changes unless explicitly updated)
@@ -224,20 +372,42 @@ def update_product_price(product_id, price_update):
             update_data["discount_price"] = None
             update_data["price"] = original_price
     
+    # Older documents only store price; pin the base price before price is discounted
+    if "price" in update_data and "original_price" not in product:
+        update_data.setdefault("original_price", original_price)
+    
+    update_data.update(effective_price_fields({**product, **update_data}))
+    return update_data
+
+def update_product_price(product_id, price_update):
+    # Get current product to access original_price
+    product = db["products"].find_one({"_id": ObjectId(product_id)})
+    if not product:
+        return None
+    
+    update_data = price_update_fields(product, price_update)
     result = db["products"].update_one(
         {"_id": ObjectId(product_id)},
         {"$set": update_data}
     )
     if result.matched_count:
+        bump_version("products")
+        if update_data["effective_price"] < product.get("effective_price", update_data["effective_price"]):
+            notification_service.notify_sale([product_id])
         return get_product_by_id(product_id)
     return None
 
 def update_product_stock(product_id, stock_update):
-    result = db["products"].update_one(
+    before = db["products"].find_one_and_update(
         {"_id": ObjectId(product_id)},
-        {"$set": {"stock_quantity": stock_update.stock_quantity}}
+        {"$set": {"stock_quantity": stock_update.stock_quantity}},
+        projection={"stock_quantity": 1},
+        return_document=ReturnDocument.BEFORE
     )
-    if result.matched_count:
+    if before:
+        bump_version("products")
+        if (before.get("stock_quantity") or 0) <= 0 < stock_update.stock_quantity:
+            notification_service.notify_restock([product_id])
         return get_product_by_id(product_id)
     return None
 
@@ -247,12 +417,19 @@ def change_availability(product_id, is_available):
         {"$set": {"is_available": is_available}}
     )
     if result.matched_count:
+        bump_version("products")
+        suggest_service.reindex_product(ObjectId(product_id))
         return get_product_by_id(product_id)
     return None
 
 def delete_product(product_id):
-    result = db["products"].delete_one({"_id": ObjectId(product_id)})
-    return result.deleted_count > 0
+    deleted = db["products"].find_one_and_delete({"_id": ObjectId(product_id)}, projection={"category_id": 1, "category": 1})
+    bump_version("products")
+    suggest_service.remove_product(product_id)
+    if not deleted:
+        return False
+    adjust_product_counts({deleted.get("category_id") or category_id_for(deleted.get("category")): -1})
+    return True
 
 
 
@@ -0,0 +1,59 @@
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from app.core.database import client
+from app.core.counter_buffer import CounterBuffer
+
+db = client['beads_db']
+products_collection = db['products']
+
+# Views and clicks are buffered in memory and written with one bulk_write per flush
+COUNTER_FLUSH_SECONDS = 10
+MAX_BUFFERED_PRODUCTS = 10000
+
+_buffer = CounterBuffer(max_keys=MAX_BUFFERED_PRODUCTS)
+
+
+def _record(product_id, field):
+    try:
+        ObjectId(product_id)
+    except (InvalidId, TypeError):
+        return
+    _buffer.increment(product_id, field)
+
+
+def record_view(product_id):
+    _record(product_id, "view_count")
+
+
+def record_click(product_id):
+    _record(product_id, "click_count")
+
+
+def flush_product_counters():
+    """
+    Write buffered counts to products.view_count/click_count with one unordered
+    bulk_write of $inc updates. Counts from a flush that could not reach the
+    database go back into the buffer.
+    Counters are not part of any response, so ETags are left alone.
+    Returns: number of products updated
+    """
+    dropped = _buffer.dropped
+    counts = _buffer.drain()
+    if dropped:
+        print(f"⚠️ Product counter buffer full, dropped {dropped} events")
+    if not counts:
+        return 0
+    operations = [
+        UpdateOne({"_id": ObjectId(product_id)}, {"$inc": fields})
+        for product_id, fields in counts.items()
+    ]
+    try:
+        return products_collection.bulk_write(operations, ordered=False).modified_count
+    except BulkWriteError:
+        # Some updates were applied; retrying all of them would double count
+        raise
+    except PyMongoError:
+        _buffer.restore(counts)
+        raise
@@ -0,0 +1,226 @@
+"""
+"Customers also bought" recommendations from order co-purchases.
+
+A batch job walks new orders in _id order, adds every pair of products
+bought together to product_co_purchases (one counter per ordered pair) and
+then rewrites the top-K neighbours of each touched product into
+product_recommendations. Serving a product's recommendations is a single
+_id read there plus one query for current prices. Runs in the background
+every hour, or from the command line:
+
+    python -m app.services.product.recommendation_service            # process new orders
+    python -m app.services.product.recommendation_service --rebuild  # recount from scratch
+"""
+import argparse
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import permutations
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.core.database import client
+from app.core.etag import bump_version
+from app.services.product.product_service import format_products, product_projection
+from app.services.product.product_page_service import RELATED_PRODUCT_FIELDS, RELATED_PRODUCT_LIMIT
+from app.core.projection import select_fields
+
+db = client['beads_db']
+orders_collection = db['orders']
+pairs_collection = db['product_co_purchases']
+recommendations_collection = db['product_recommendations']
+state_collection = db['job_state']
+
+CO_PURCHASE_INTERVAL_SECONDS = 3600
+CO_PURCHASE_TOP_K = 20
+ORDER_BATCH_SIZE = 1000
+# Pairs grow quadratically with basket size; very large orders only count their first items
+MAX_ITEMS_PER_ORDER = 50
+# Only one run folds orders at a time (every worker starts the job); a run that
+# dies keeps the lease until it expires. Each batch renews it.
+CO_PURCHASE_LEASE_SECONDS = 600
+_STATE_ID = 'co_purchase'
+
+
+def _order_product_ids(order):
+    product_ids = []
+    for item in order.get('items') or []:
+        product_id = item.get('product_id')
+        if product_id and product_id not in product_ids:
+            product_ids.append(product_id)
+    return product_ids[:MAX_ITEMS_PER_ORDER]
+
+
+def _count_pairs(orders):
+    pair_counts = Counter()
+    for order in orders:
+        pair_counts.update(permutations(_order_product_ids(order), 2))
+    return pair_counts
+
+
+def _write_pair_counts(pair_counts):
+    operations = [
+        UpdateOne({'product_id': product_id, 'other_id': other_id}, {'$inc': {'count': count}}, upsert=True)
+        for (product_id, other_id), count in pair_counts.items()
+    ]
+    if operations:
+        pairs_collection.bulk_write(operations, ordered=False)
+
+
+def _refresh_top_neighbours(product_ids, batch_size=500):
+    """Rewrite product_recommendations for product_ids from their current pair counts"""
+    product_ids = list(product_ids)
+    now = datetime.utcnow()
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        pipeline = [
+            {'$match': {'product_id': {'$in': batch}}},
+            {'$sort': {'product_id': 1, 'count': -1, 'other_id': 1}},
+            {'$group': {'_id': '$product_id', 'neighbours': {'$push': {'product_id': '$other_id', 'count': '$count'}}}},
+            {'$project': {'neighbours': {'$slice': ['$neighbours', CO_PURCHASE_TOP_K]}}}
+        ]
+        operations = [
+            UpdateOne(
+                {'_id': doc['_id']},
+                {'$set': {
+                    'related': [neighbour['product_id'] for neighbour in doc['neighbours']],
+                    'counts': [neighbour['count'] for neighbour in doc['neighbours']],
+                    'updated_at': now
+                }},
+                upsert=True
+            )
+            for doc in pairs_collection.aggregate(pipeline)
+        ]
+        if operations:
+            recommendations_collection.bulk_write(operations, ordered=False)
+
+
+def _claim_lease():
+    """
+    Take the job lease on the job_state document.
+    Returns: (lease token, state document), or (None, None) while another run holds it
+    """
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    try:
+        state = state_collection.find_one_and_update(
+            {'_id': _STATE_ID, '$or': [{'lease_until': None}, {'lease_until': {'$lt': now}}]},
+            {'$set': {'lease_token': token, 'lease_until': now + timedelta(seconds=CO_PURCHASE_LEASE_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The document exists and its lease is held, so the upsert tried to insert a second one
+        return None, None
+    return token, state
+
+
+def _save_checkpoint(token, fields):
+    """Store checkpoint fields and renew the lease; False when the lease was lost"""
+    now = datetime.utcnow()
+    result = state_collection.update_one(
+        {'_id': _STATE_ID, 'lease_token': token},
+        {'$set': {**fields, 'updated_at': now, 'lease_until': now + timedelta(seconds=CO_PURCHASE_LEASE_SECONDS)}}
+    )
+    return result.matched_count > 0
+
+
+def _release_lease(token):
+    state_collection.update_one({'_id': _STATE_ID, 'lease_token': token}, {'$set': {'lease_until': None}})
+
+
+def _fold_orders(token, last_order_id):
+    processed = 0
+    touched = set()
+    while True:
+        query = {'status': {'$ne': 'cancelled'}}
+        if last_order_id:
+            query['_id'] = {'$gt': last_order_id}
+        orders = list(orders_collection.find(query, {'items.product_id': 1}).sort('_id', 1).limit(ORDER_BATCH_SIZE))
+        if not orders:
+            break
+        # Renew the lease before counting, so a run that lost it never writes counts
+        if not _save_checkpoint(token, {}):
+            break
+        pair_counts = _count_pairs(orders)
+        _write_pair_counts(pair_counts)
+        touched.update(product_id for product_id, _ in pair_counts)
+
+        last_order_id = orders[-1]['_id']
+        if not _save_checkpoint(token, {'last_order_id': last_order_id}):
+            break
+        processed += len(orders)
+        if len(orders) < ORDER_BATCH_SIZE:
+            break
+
+    if touched:
+        _refresh_top_neighbours(touched)
+        bump_version('product_recommendations')
+    return processed
+
+
+def update_co_purchases():
+    """
+    Fold orders placed since the last run into the co-purchase counts and
+    refresh the recommendations of every product they touched.
+    Orders already cancelled are skipped; a batch interrupted before its
+    checkpoint is saved is counted again on the next run. Does nothing while
+    another worker's run holds the lease.
+    Returns: number of orders processed
+    """
+    token, state = _claim_lease()
+    if not token:
+        return 0
+    try:
+        return _fold_orders(token, state.get('last_order_id'))
+    finally:
+        _release_lease(token)
+
+
+def rebuild_co_purchases():
+    """
+    Drop all counts and recommendations and recount every order.
+    Raises RuntimeError while another run holds the lease.
+    """
+    token, _ = _claim_lease()
+    if not token:
+        raise RuntimeError("Co-purchase job is running in another process; try again later")
+    try:
+        pairs_collection.delete_many({})
+        recommendations_collection.delete_many({})
+        if not _save_checkpoint(token, {'last_order_id': None}):
+            return 0
+        return _fold_orders(token, None)
+    finally:
+        _release_lease(token)
+
+
+def get_related_products(product_id, limit=RELATED_PRODUCT_LIMIT):
+    """
+    Products most often bought together with product_id, best first.
+    Unavailable products are skipped; returns [] until the job has seen the product.
+    """
+    recommendation = recommendations_collection.find_one({'_id': product_id}, {'related': 1})
+    if not recommendation:
+        return []
+    object_ids = []
+    for related_id in recommendation.get('related', []):
+        try:
+            object_ids.append(ObjectId(related_id))
+        except (InvalidId, TypeError):
+            continue
+    query = {'_id': {'$in': object_ids}, 'is_available': True}
+    products = list(db['products'].find(query, product_projection(RELATED_PRODUCT_FIELDS)))
+    rank = {object_id: i for i, object_id in enumerate(object_ids)}
+    products.sort(key=lambda product: rank[product['_id']])
+    return [select_fields(item, RELATED_PRODUCT_FIELDS) for item in format_products(products[:limit])]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Update co-purchase recommendations from orders")
+    parser.add_argument('--rebuild', action='store_true', help="Recount all orders from scratch")
+    args = parser.parse_args()
+
+    count = rebuild_co_purchases() if args.rebuild else update_co_purchases()
+    print(f"✅ Processed {count} orders")
@@ -1,7 +1,65 @@
-from app.core.database import client
+from app.core.database import client, async_client
+from app.core.etag import bump_version
 from bson.objectid import ObjectId
+from pymongo import UpdateOne
 from datetime import datetime
 
+def _rating_change_pipeline(removed=None, added=None):
+	"""
+	Update pipeline moving a product's approved-rating aggregate by one review:
+	removed/added are the star ratings leaving and entering it (either may be None).
+	review_count, rating_sum and rating_histogram change and ratings is re-averaged
+	in the same atomic document update.
+	"""
+	count_delta = (1 if added else 0) - (1 if removed else 0)
+	sum_delta = (added or 0) - (removed or 0)
+	changes = {
+		"review_count": {"$add": [{"$ifNull": ["$review_count", 0]}, count_delta]},
+		"rating_sum": {"$add": [{"$ifNull": ["$rating_sum", 0]}, sum_delta]}
+	}
+	histogram_deltas = {}
+	for rating, delta in ((removed, -1), (added, 1)):
+		if rating:
+			histogram_deltas[rating] = histogram_deltas.get(rating, 0) + delta
+	for rating, delta in histogram_deltas.items():
+		changes[f"rating_histogram.{rating}"] = {"$add": [{"$ifNull": [f"$rating_histogram.{rating}", 0]}, delta]}
+	average = {"$cond": [
+		{"$gt": ["$review_count", 0]},
+		{"$round": [{"$divide": ["$rating_sum", "$review_count"]}, 2]},
+		0.0
+	]}
+	return [{"$set": changes}, {"$set": {"ratings": average}}]
+
+# Products created before the approved-only aggregate have no rating_sum yet; a one-time
+# background backfill fills them in, and a review change on one of them recomputes that
+# product from its reviews instead of applying a delta to the old review_count.
+RATING_BACKFILL_SECONDS = 3600
+_BACKFILL_STATE_ID = 'rating_aggregates'
+_HAS_AGGREGATE = {"rating_sum": {"$exists": True}}
+
+def _approved_rating(review):
+	return review.get("rating") if review and review.get("is_approved") else None
+
+def _apply_rating_change(product_id, before, after):
+	"""Move the product aggregate from review state before to after (None = no review)"""
+	removed, added = _approved_rating(before), _approved_rating(after)
+	if removed == added:
+		return
+	result = db["products"].update_one({"_id": ObjectId(product_id), **_HAS_AGGREGATE}, _rating_change_pipeline(removed, added))
+	if not result.matched_count:
+		_recompute_rating(product_id)
+	bump_version("products")
+
+async def _apply_rating_change_async(product_id, before, after):
+	removed, added = _approved_rating(before), _approved_rating(after)
+	if removed == added:
+		return
+	result = await async_db["products"].update_one({"_id": ObjectId(product_id), **_HAS_AGGREGATE}, _rating_change_pipeline(removed, added))
+	if not result.matched_count:
+		aggregates = await _rating_aggregates_async([product_id])
+		await async_db["products"].update_one({"_id": ObjectId(product_id)}, _aggregate_update(aggregates.get(product_id)))
+	bump_version("products")
+
 def create_review(product_id, user_id, review_data):
 	review_dict = review_data.dict()
 	review_dict["product_id"] = product_id
@@ -16,14 +74,7 @@ def create_review(product_id, user_id, review_data):
 	result = db["reviews"].insert_one(review_dict)
 	review_dict["_id"] = str(result.inserted_id)
 	review_dict["helpful_count"] = 0
-	# Update product's review list and review count
-	db["products"].update_one(
-		{"_id": ObjectId(product_id)},
-		{
-			"$push": {"reviews": review_dict["_id"]},
-			"$inc": {"review_count": 1}
-		}
-	)
+	# New reviews wait for approval, so the product's rating aggregate is unchanged
 	return review_dict
 
 def get_review_by_id(review_id):
@@ -38,29 +89,62 @@ def get_review_by_id(review_id):
 		review["created_at"] = review.get("created_at", datetime.utcnow())
 	return review
 
-def get_product_reviews(product_id, skip=0, limit=20):
-	reviews = list(db["reviews"].find({"product_id": product_id}).skip(skip).limit(limit))
-	for review in reviews:
-		review["_id"] = str(review["_id"])
-		user = db["users"].find_one({"_id": ObjectId(review["user_id"])})
-		review["username"] = user["username"] if user and "username" in user else "Unknown"
-		review["is_verified_purchase"] = review.get("is_verified_purchase", False)
-		review["helpful_count"] = len(review.get("helpful", []))
-		review["created_at"] = review.get("created_at", datetime.utcnow())
-	return reviews
+async def _usernames_async(user_ids):
+	"""Map user id -> username with a single users lookup"""
+	object_ids = [ObjectId(uid) for uid in set(user_ids)]
+	if not object_ids:
+		return {}
+	users = await async_db["users"].find({"_id": {"$in": object_ids}}, {"username": 1}).to_list(length=None)
+	return {str(user["_id"]): user.get("username", "Unknown") for user in users}
+
+def _format_review(review, usernames):
+	review["_id"] = str(review["_id"])
+	review["username"] = usernames.get(review["user_id"], "Unknown")
+	review["is_verified_purchase"] = review.get("is_verified_purchase", False)
+	review["helpful_count"] = len(review.get("helpful", []))
+	review["created_at"] = review.get("created_at", datetime.utcnow())
+	return review
+
+async def get_review_by_id_async(review_id):
+	review = await async_db["reviews"].find_one({"_id": ObjectId(review_id)})
+	if review:
+		review = _format_review(review, await _usernames_async([review["user_id"]]))
+	return review
+
+async def get_product_reviews_async(product_id, skip=0, limit=20):
+	cursor = async_db["reviews"].find({"product_id": product_id}).skip(skip).limit(limit)
+	reviews = await cursor.to_list(length=None)
+	usernames = await _usernames_async([review["user_id"] for review in reviews])
+	return [_format_review(review, usernames) for review in reviews]
+
+async def get_approved_reviews_async(product_id, limit=10):
+	"""Newest approved reviews of a product, as shown on the product page"""
+	cursor = async_db["reviews"].find({"product_id": product_id, "is_approved": True}).sort("created_at", -1).limit(limit)
+	reviews = await cursor.to_list(length=None)
+	usernames = await _usernames_async([review["user_id"] for review in reviews])
+	return [_format_review(review, usernames) for review in reviews]
 
 def update_review(review_id, user_id, review_update):
-	result = db["reviews"].update_one(
+	update_data = review_update.dict(exclude_unset=True)
+	before = db["reviews"].find_one_and_update(
 		{"_id": ObjectId(review_id), "user_id": user_id},
-		{"$set": review_update.dict(exclude_unset=True)}
+		{"$set": update_data},
+		projection={"product_id": 1, "rating": 1, "is_approved": 1}
 	)
-	if result.modified_count:
-		return get_review_by_id(review_id)
-	return None
+	if not before:
+		return None
+	_apply_rating_change(before["product_id"], before, {**before, **update_data})
+	return get_review_by_id(review_id)
 
 def delete_review(review_id, user_id):
-	result = db["reviews"].delete_one({"_id": ObjectId(review_id), "user_id": user_id})
-	return result.deleted_count > 0
+	deleted = db["reviews"].find_one_and_delete(
+		{"_id": ObjectId(review_id), "user_id": user_id},
+		projection={"product_id": 1, "rating": 1, "is_approved": 1}
+	)
+	if not deleted:
+		return False
+	_apply_rating_change(deleted["product_id"], deleted, None)
+	return True
 
 def mark_review_helpful(review_id, user_id, action):
 	review = db["reviews"].find_one({"_id": ObjectId(review_id)})
@@ -74,14 +158,102 @@ def mark_review_helpful(review_id, user_id, action):
 	db["reviews"].update_one({"_id": ObjectId(review_id)}, {"$set": {"helpful": list(helpful)}})
 	return get_review_by_id(review_id)
 
-def update_review_approval(review_id, is_approved):
-	result = db["reviews"].update_one(
+async def update_review_approval_async(review_id, is_approved):
+	before = await async_db["reviews"].find_one_and_update(
 		{"_id": ObjectId(review_id)},
-		{"$set": {"is_approved": is_approved}}
+		{"$set": {"is_approved": is_approved}},
+		projection={"product_id": 1, "rating": 1, "is_approved": 1}
 	)
-	if result.modified_count:
-		return get_review_by_id(review_id)
+	if before and before.get("is_approved") != is_approved:
+		await _apply_rating_change_async(before["product_id"], before, {**before, "is_approved": is_approved})
+		return await get_review_by_id_async(review_id)
 	return None
 
+def _rating_pipeline(product_ids=None):
+	match = {"is_approved": True}
+	if product_ids is not None:
+		match["product_id"] = {"$in": list(product_ids)}
+	return [
+		{"$match": match},
+		{"$group": {"_id": {"product_id": "$product_id", "rating": "$rating"}, "count": {"$sum": 1}}}
+	]
+
+def _collect_aggregates(buckets):
+	aggregates = {}
+	for bucket in buckets:
+		product_id, rating = bucket["_id"]["product_id"], bucket["_id"]["rating"]
+		aggregate = aggregates.setdefault(product_id, {"review_count": 0, "rating_sum": 0, "rating_histogram": {}})
+		aggregate["review_count"] += bucket["count"]
+		aggregate["rating_sum"] += rating * bucket["count"]
+		aggregate["rating_histogram"][str(rating)] = bucket["count"]
+	return aggregates
+
+def _rating_aggregates(product_ids=None):
+	"""{product_id: {review_count, rating_sum, rating_histogram}} from approved reviews"""
+	return _collect_aggregates(db["reviews"].aggregate(_rating_pipeline(product_ids)))
+
+async def _rating_aggregates_async(product_ids):
+	cursor = await async_db["reviews"].aggregate(_rating_pipeline(product_ids))
+	return _collect_aggregates(await cursor.to_list(length=None))
+
+def _aggregate_update(aggregate):
+	"""Update storing an aggregate (None = no approved reviews) and dropping the legacy reviews id array"""
+	aggregate = dict(aggregate or {"review_count": 0, "rating_sum": 0, "rating_histogram": {}})
+	count = aggregate["review_count"]
+	aggregate["ratings"] = round(aggregate["rating_sum"] / count, 2) if count else 0.0
+	return {"$set": aggregate, "$unset": {"reviews": ""}}
+
+def _recompute_rating(product_id):
+	db["products"].update_one({"_id": ObjectId(product_id)}, _aggregate_update(_rating_aggregates([product_id]).get(product_id)))
+
+def rebuild_rating_aggregates():
+	"""
+	Recompute every product's rating aggregate from its approved reviews and drop
+	the legacy reviews id array. For repairs; normal writes keep it current.
+	Returns: number of products updated
+	"""
+	aggregates = _rating_aggregates()
+	operations = [
+		UpdateOne({"_id": product["_id"]}, _aggregate_update(aggregates.get(str(product["_id"]))))
+		for product in db["products"].find({}, {"_id": 1})
+	]
+	for start in range(0, len(operations), 500):
+		db["products"].bulk_write(operations[start:start + 500], ordered=False)
+	bump_version("products")
+	return len(operations)
+
+def backfill_rating_aggregates(batch_size=500):
+	"""
+	One-time migration: fill in the aggregate of every product that has none yet,
+	a batch at a time. Each update only applies while the product still has no
+	aggregate, so one set by a concurrent review change is kept. Runs in the
+	background until done, then is a no-op.
+	Returns: number of products updated
+	"""
+	state = db["job_state"].find_one({"_id": _BACKFILL_STATE_ID}) or {}
+	if state.get("done"):
+		return 0
+	updated = 0
+	while True:
+		products = list(db["products"].find({"rating_sum": {"$exists": False}}, {"_id": 1}).limit(batch_size))
+		if not products:
+			break
+		product_ids = [str(product["_id"]) for product in products]
+		aggregates = _rating_aggregates(product_ids)
+		operations = [
+			UpdateOne({"_id": product["_id"], "rating_sum": {"$exists": False}}, _aggregate_update(aggregates.get(product_id)))
+			for product, product_id in zip(products, product_ids)
+		]
+		updated += db["products"].bulk_write(operations, ordered=False).modified_count
+	db["job_state"].update_one({"_id": _BACKFILL_STATE_ID}, {"$set": {"done": True, "finished_at": datetime.utcnow()}}, upsert=True)
+	if updated:
+		bump_version("products")
+	return updated
+
 
 db = client['beads_db']  # Use your DB name here
+async_db = async_client['beads_db']
+
+
+if __name__ == '__main__':
+	print(f"✅ Rebuilt rating aggregates for {rebuild_rating_aggregates()} products")
@@ -0,0 +1,106 @@
+import string
+import threading
+from app.core.database import client
+from app.core.prefix_index import PrefixIndex
+from app.services.product.product_references import category_name
+
+db = client['beads_db']
+products_collection = db['products']
+
+# Product writes update the index in place; the periodic rebuild picks up writes from other workers.
+# Rebuilds never run inside a request: until the first one finishes suggest() returns [],
+# and after an invalidation the old index keeps answering until the new one is swapped in.
+SUGGEST_REBUILD_SECONDS = 300
+SUGGEST_LIMIT = 10
+SUGGEST_PROJECTION = {"name": 1, "tags": 1, "category_id": 1, "category": 1, "review_count": 1, "is_available": 1, "is_active": 1}
+
+_index = None
+_rebuild_lock = threading.Lock()
+
+
+def _product_suggestions(product):
+    """Suggestions a product contributes: its name, tags and category, weighted by popularity"""
+    if not product.get("is_available", True) or not product.get("is_active", True):
+        return []
+    score = 1 + (product.get("review_count") or 0)
+    suggestions = [("product", product.get("name") or "", score, str(product["_id"]))]
+    suggestions += [("tag", tag, score, None) for tag in set(product.get("tags") or [])]
+    category = category_name(product)
+    if category:
+        suggestions.append(("category", category, score, None))
+    return suggestions
+
+
+def rebuild_suggest_index():
+    """Build a fresh index from all products and swap it in"""
+    global _index
+    index = PrefixIndex()
+    products = products_collection.find({}, SUGGEST_PROJECTION).batch_size(1000)
+    index.load((str(product["_id"]), _product_suggestions(product)) for product in products)
+    # Single characters match the longest runs; answer them from cache from the first keystroke
+    for char in string.ascii_lowercase + string.digits:
+        index.search(char, SUGGEST_LIMIT)
+    _index = index
+    return len(index)
+
+
+def index_products(products):
+    """Add or replace products (documents with at least SUGGEST_PROJECTION fields)"""
+    index = _index
+    if index is None:
+        return
+    for product in products:
+        index.replace(str(product["_id"]), _product_suggestions(product))
+
+
+def reindex_product(product_id):
+    """Re-read one product after a write and update its suggestions"""
+    index = _index
+    if index is None:
+        return
+    product = products_collection.find_one({"_id": product_id}, SUGGEST_PROJECTION)
+    if product:
+        index_products([product])
+    else:
+        index.remove(str(product_id))
+
+
+def remove_product(product_id):
+    index = _index
+    if index is not None:
+        index.remove(str(product_id))
+
+
+def _rebuild_in_background():
+    if not _rebuild_lock.acquire(blocking=False):
+        return  # one rebuild at a time; the periodic rebuild catches anything it missed
+    try:
+        rebuild_suggest_index()
+    except Exception as e:
+        print("❌ Could not rebuild the suggest index:", e)
+    finally:
+        _rebuild_lock.release()
+
+
+def schedule_suggest_rebuild():
+    """Rebuild the index on a worker thread; the current index keeps serving meanwhile"""
+    threading.Thread(target=_rebuild_in_background, name="suggest-rebuild", daemon=True).start()
+
+
+def invalidate_suggest_index():
+    """Rebuild after writes that touch many products"""
+    schedule_suggest_rebuild()
+
+
+def suggest(q, limit=SUGGEST_LIMIT):
+    """
+    Autocomplete for the search box: product names, tags and categories with
+    a word starting with q, most popular first
+    Returns: [{"text", "kind", "ref", "score"}] where ref is the product id for product suggestions
+    """
+    # Read once: another thread may swap the index at any time
+    index = _index
+    if index is None:
+        schedule_suggest_rebuild()
+        return []
+    return index.search(q, limit)
@@ -1,5 +1,7 @@
 from app.core.database import client
 from bson.objectid import ObjectId
+from app.services.product.pricing_service import find_priced_products
+from app.services.product.flash_sale_service import is_sold_out
 db = client['beads_db']  # Use your DB name here
 def get_cart(user_id):
     cart = db['carts'].find_one({'user_id': user_id})
@@ -12,11 +14,12 @@ def get_cart(user_id):
     cart_items = []
     total_items = 0
     total_price = 0.0
+    # Fetch and price every product in the cart in one batch
+    priced = find_priced_products([item['product_id'] for item in cart.get('items', [])])
     for item in cart.get('items', []):
-        # Fetch product details (name, price, image) from products collection
-        product = db['products'].find_one({'_id': ObjectId(item['product_id'])})
+        product, (final_price, _, _) = priced.get(item['product_id'], (None, (0.0, None, None)))
         product_name = product['name'] if product else "Unknown"
-        price = product['price'] if product else 0.0
+        price = final_price if product else 0.0
         product_image = product.get('image_urls', [None])[0] if product else None
         quantity = item.get('quantity', 1)
         subtotal = price * quantity
@@ -39,6 +42,9 @@ def get_cart(user_id):
 def add_to_cart(user_id, cart_item):
     product_id = cart_item.product_id
     quantity = cart_item.quantity
+    # Sold-out flash-sale products are turned away without touching the product document
+    if is_sold_out(product_id, quantity):
+        raise Exception("Sold out")
     if not validate_stock(product_id, quantity):
         raise Exception("Not enough stock")
     # Fetch product details for name
@@ -102,10 +108,11 @@ def clear_cart(user_id):
 
 def calculate_cart_total(cart):
     total = 0
+    priced = find_priced_products([item["product_id"] for item in cart["items"]])
     for item in cart["items"]:
-        product = db["products"].find_one({"_id": ObjectId(item["product_id"])})
-        if product:
-            total += product["price"] * item["quantity"]
+        if item["product_id"] in priced:
+            _, (final_price, _, _) = priced[item["product_id"]]
+            total += final_price * item["quantity"]
     return total
 
 def validate_stock(product_id, quantity):
@@ -0,0 +1,143 @@
+"""
+Wishlist restock and price-drop notifications.
+
+Writes that restock a product or lower its price only enqueue a small job
+in notification_jobs. A background job claims the jobs, finds the
+interested wishlist entries through the items.product_id index and
+inserts notifications in batches:
+
+- one notification per user, product and kind per day (dedupe_key is unique,
+  so repeats are rejected by the insert itself)
+- at most MAX_NOTIFICATIONS_PER_USER_PER_DAY per user
+
+Notifications are an outbox: delivery (email, push, in-app) reads from it.
+"""
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from app.core.database import client
+
+db = client['beads_db']
+jobs_collection = db['notification_jobs']
+notifications_collection = db['notifications']
+wishlists_collection = db['wishlists']
+
+NOTIFICATION_SWEEP_SECONDS = 30
+NOTIFICATION_BATCH_SIZE = 500
+MAX_NOTIFICATIONS_PER_USER_PER_DAY = 5
+# A job still running after this long is assumed to have died with its worker
+STALE_JOB_MINUTES = 10
+
+# Job kind -> wishlist flag that opts in to it
+NOTIFICATION_KINDS = {
+    "restock": "notify_on_restock",
+    "sale": "notify_on_sale",
+}
+
+
+def enqueue(kind, product_ids):
+    """Queue notifications for wishlists of product_ids; one small write, safe inside requests"""
+    product_ids = sorted({str(product_id) for product_id in product_ids})
+    if not product_ids:
+        return
+    jobs_collection.insert_one({
+        "kind": kind,
+        "product_ids": product_ids,
+        "status": "pending",
+        "created_at": datetime.utcnow()
+    })
+
+
+def notify_restock(product_ids):
+    enqueue("restock", product_ids)
+
+
+def notify_sale(product_ids):
+    enqueue("sale", product_ids)
+
+
+def _claim_job(now):
+    stale_before = now - timedelta(minutes=STALE_JOB_MINUTES)
+    return jobs_collection.find_one_and_update(
+        {"$or": [
+            {"status": "pending"},
+            {"status": "running", "started_at": {"$lt": stale_before}}
+        ]},
+        {"$set": {"status": "running", "started_at": now}},
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _sent_today(user_ids, day):
+    pipeline = [
+        {"$match": {"user_id": {"$in": user_ids}, "day": day}},
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+    ]
+    return {row["_id"]: row["count"] for row in notifications_collection.aggregate(pipeline)}
+
+
+def _insert_batch(kind, entries, now):
+    """entries: [(user_id, product_id)]; returns number of notifications inserted"""
+    day = now.strftime("%Y-%m-%d")
+    sent = _sent_today(list({user_id for user_id, _ in entries}), day)
+    documents = []
+    for user_id, product_id in entries:
+        if sent.get(user_id, 0) >= MAX_NOTIFICATIONS_PER_USER_PER_DAY:
+            continue
+        sent[user_id] = sent.get(user_id, 0) + 1
+        documents.append({
+            "user_id": user_id,
+            "kind": kind,
+            "product_id": product_id,
+            "day": day,
+            "dedupe_key": f"{kind}:{product_id}:{user_id}:{day}",
+            "is_read": False,
+            "created_at": now
+        })
+    if not documents:
+        return 0
+    try:
+        return len(notifications_collection.insert_many(documents, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        # Duplicate dedupe_keys are notifications already sent today
+        return e.details.get("nInserted", 0)
+
+
+def _run_job(job, now):
+    flag = NOTIFICATION_KINDS[job["kind"]]
+    product_ids = set(job["product_ids"])
+    query = {"items": {"$elemMatch": {"product_id": {"$in": job["product_ids"]}, flag: True}}}
+    cursor = wishlists_collection.find(query, {"user_id": 1, "items.product_id": 1, f"items.{flag}": 1})
+
+    inserted = 0
+    entries = []
+    for wishlist in cursor.batch_size(NOTIFICATION_BATCH_SIZE):
+        for item in wishlist.get("items", []):
+            if item.get("product_id") in product_ids and item.get(flag):
+                entries.append((wishlist["user_id"], item["product_id"]))
+        if len(entries) >= NOTIFICATION_BATCH_SIZE:
+            inserted += _insert_batch(job["kind"], entries, now)
+            entries = []
+    if entries:
+        inserted += _insert_batch(job["kind"], entries, now)
+    return inserted
+
+
+def process_notification_jobs():
+    """
+    Fan out every queued job into notifications
+    Returns: number of notifications inserted
+    """
+    inserted = 0
+    while True:
+        now = datetime.utcnow()
+        job = _claim_job(now)
+        if not job:
+            return inserted
+        count = _run_job(job, now)
+        jobs_collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": "done", "finished_at": datetime.utcnow(), "notifications": count}}
+        )
+        inserted += count
@@ -1,30 +1,23 @@
 from app.core.database import client
-from bson.objectid import ObjectId
-from bson.errors import InvalidId
 from datetime import datetime
 from app.services.user.cart_service import add_to_cart
 from app.schemas.user.cart_schemas import CartItemAdd
+from app.services.product.pricing_service import find_priced_products
 from fastapi import HTTPException
-from bson.errors import InvalidId
 
 
 def get_wishlist(user_id):
     wishlist = db["wishlists"].find_one({"user_id": user_id})
     items = wishlist["items"] if wishlist and "items" in wishlist else []
     response_items = []
+    # Fetch and price every wishlisted product in one batch
+    priced = find_priced_products([str(item["product_id"]) for item in items])
     for item in items:
-        product = None
-        try:
-            product = db["products"].find_one({"_id": ObjectId(item["product_id"])})
-        except (InvalidId, TypeError):
-            product = db["products"].find_one({"_id": item["product_id"]})
-        if not product:
-            # Try matching by string if ObjectId fails
-            product = db["products"].find_one({"_id": str(item["product_id"])})
+        product, (final_price, _, _) = priced.get(str(item["product_id"]), (None, (None, None, None)))
         response_items.append({
             "product_id": item["product_id"],
             "product_name": product["name"] if product else "(Product not found)",
-            "product_price": float(product["price"]) if product and product.get("price") is not None else 0.0,
+            "product_price": float(final_price) if product and final_price is not None else 0.0,
             "product_image": product["images"][0] if product and product.get("images") else None,
             "is_available": product["is_available"] if product else False,
             "added_at": item["added_at"],